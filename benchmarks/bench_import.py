@@ -0,0 +1,94 @@
+"""
+Measures the cold import cost of the client and of the OCR server.
+
+Every module is imported in a fresh interpreter started with ``python -X importtime``
+so nothing is served from an already warm ``sys.modules``.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat 5] [module ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["meta_ai_api", "meta_ai_api.server"]
+
+# Prints the peak RSS of the child once the import is done (ru_maxrss is KiB on Linux).
+_PROBE = (
+    "import resource, sys; import {module}; "
+    "sys.stdout.write(str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))"
+)
+
+
+def measure(module: str) -> dict:
+    """
+    Imports a module in a fresh interpreter and collects its import statistics.
+
+    Args:
+        module (str): The dotted name of the module to import.
+
+    Returns:
+        dict: The cumulative import time in ms, the peak RSS in MiB and the
+        slowest direct imports.
+    """
+    env = dict(os.environ)
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    total_us = 0
+    children = []
+    block = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        block.append((depth, int(cumulative), name.strip()))
+        if depth == 0:
+            # A subtree is printed before its root, so the block that ends here is
+            # everything the root pulled in (interpreter startup lands in other blocks).
+            if name.strip() == module:
+                total_us = int(cumulative)
+                children = [(us, child) for d, us, child in block if d == 1]
+            block = []
+
+    children.sort(reverse=True)
+    return {
+        "import_ms": total_us / 1000,
+        "rss_mib": int(result.stdout) / 1024,
+        "slowest": children[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.repeat)]
+        import_ms = [run["import_ms"] for run in runs]
+        rss_mib = [run["rss_mib"] for run in runs]
+        print(
+            f"{module}: import {statistics.median(import_ms):.1f} ms "
+            f"(min {min(import_ms):.1f}, max {max(import_ms):.1f}), "
+            f"peak RSS {statistics.median(rss_mib):.1f} MiB"
+        )
+        for cumulative, name in runs[-1]["slowest"]:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -35,6 +35,8 @@ setuptools.setup(
     python_requires=">=3.6",
     extras_require={
         "dev": ["check-manifest"],
+        "http2": ["httpx[http2]"],
+        "server": ["fastapi", "uvicorn", "pydantic", "pillow", "pytesseract"],
     },
-    install_requires=["requests", "requests-html", "lxml_html_clean"],
+    install_requires=["requests"],
 )
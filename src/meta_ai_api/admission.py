@@ -0,0 +1,122 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request cannot get a slot in a stage in time.
+
+    Attributes:
+        status_code (int): 429 when the wait queue is full, 503 when the deadline cannot be met.
+        retry_after (int): Seconds after which the client may try again.
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Bulkhead:
+    """
+    Caps how many requests run a stage at once and how many may queue for it, so a
+    burst on one stage cannot exhaust the resources of the others.
+
+    Must be created inside the event loop that uses it.
+    """
+
+    def __init__(self, name: str, limit: int, max_waiting: int):
+        """
+        Args:
+            name (str): The stage name, used in error messages and stats.
+            limit (int): How many requests may run the stage concurrently.
+            max_waiting (int): How many requests may wait for a free slot.
+        """
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        # Requests holding or queued for a slot, counted as soon as they are admitted
+        # (in_flight only grows once the acquiring coroutine resumes).
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of how long a request holds a slot, to predict queue waits.
+        self.service_time = 1.0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @property
+    def waiting(self) -> int:
+        return max(0, self.admitted - self.limit)
+
+    def expected_wait(self) -> float:
+        """
+        Estimates how long a request arriving now would wait for a slot.
+
+        Returns:
+            float: The expected wait in seconds.
+        """
+        if self.admitted < self.limit:
+            return 0.0
+        return (self.waiting + 1) / self.limit * self.service_time
+
+    def _reject(self, status_code: int, reason: str):
+        self.rejected += 1
+        retry_after = max(1, math.ceil(self.expected_wait()))
+        return AdmissionRejected(
+            status_code, f"{self.name} is overloaded: {reason}", retry_after
+        )
+
+    @asynccontextmanager
+    async def slot(self, deadline: float):
+        """
+        Holds a slot of the stage for the duration of the block.
+
+        Args:
+            deadline (float): time.monotonic() value by which the request must be answered.
+
+        Raises:
+            AdmissionRejected: If the queue is full, or the slot would not be free before the deadline.
+        """
+        remaining = deadline - time.monotonic()
+        if self.admitted >= self.limit:
+            if self.waiting >= self.max_waiting:
+                raise self._reject(429, f"{self.waiting} requests already waiting")
+            if self.expected_wait() > remaining:
+                raise self._reject(503, "no free slot before the request deadline")
+
+        self.admitted += 1
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            done, _ = await asyncio.wait({acquire}, timeout=max(remaining, 0))
+        except asyncio.CancelledError:
+            self.admitted -= 1
+            if not acquire.cancel():
+                self._semaphore.release()
+            raise
+        # cancel() fails if the slot was granted right as the wait timed out.
+        if not done and acquire.cancel():
+            self.admitted -= 1
+            raise self._reject(503, "no free slot before the request deadline")
+
+        self.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.admitted -= 1
+            self._semaphore.release()
+            self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - start)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "limit": self.limit,
+            "max_waiting": self.max_waiting,
+            "rejected": self.rejected,
+            "service_time": round(self.service_time, 3),
+        }
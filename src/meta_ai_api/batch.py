@@ -0,0 +1,322 @@
+"""
+Processes receipt images offline and writes one JSON line per image.
+
+    python -m meta_ai_api.batch receipts/ "scans/**/*.jpg" manifest.txt -o results.jsonl
+
+Inputs are directories, glob patterns, image files or manifests (.txt with one path
+per line, .jsonl with a "path" field). OCR runs in a process pool and the Meta AI step
+through concurrent clients. Every result is appended to the output as soon as it is
+ready, and images that already have a successful line there are skipped, so an
+interrupted run resumes where it stopped.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Set
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp"}
+
+
+def iter_inputs(inputs: List[str]) -> Iterator[str]:
+    """
+    Expands directories, glob patterns and manifests into image paths.
+
+    Args:
+        inputs (list): The inputs given on the command line.
+
+    Yields:
+        str: The path of every image, each once, in input order.
+    """
+    seen = set()
+    for source in inputs:
+        if os.path.isdir(source):
+            paths = sorted(
+                os.path.join(source, name)
+                for name in os.listdir(source)
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+            )
+        elif os.path.isfile(source) and source.endswith(".jsonl"):
+            with open(source, encoding="utf-8") as manifest:
+                paths = [json.loads(line)["path"] for line in manifest if line.strip()]
+        elif os.path.isfile(source) and source.endswith(".txt"):
+            with open(source, encoding="utf-8") as manifest:
+                paths = [line.strip() for line in manifest if line.strip()]
+        elif os.path.isfile(source):
+            paths = [source]
+        else:
+            paths = sorted(glob.glob(source, recursive=True))
+        for path in paths:
+            if path not in seen:
+                seen.add(path)
+                yield path
+
+
+def load_checkpoint(output: str, ocr_only: bool = False) -> Set[str]:
+    """
+    Reads the paths already processed successfully from an earlier run's output.
+
+    Args:
+        output (str): The JSONL output file.
+        ocr_only (bool): Whether the OCR text is enough. Otherwise only records with
+            a Meta AI result count, so images from an --ocr-only run are prompted.
+
+    Returns:
+        set: The paths that do not need to be processed again.
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding="utf-8") as results:
+        for line in results:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of a run killed mid-write.
+                continue
+            if "error" in record:
+                done.discard(record["path"])
+            elif ocr_only or "result" in record:
+                done.add(record["path"])
+    return done
+
+
+def _init_ocr_worker():
+    # One OpenMP thread per tesseract, the pool provides the parallelism.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def ocr_file(path: str) -> Dict:
+    """
+    Runs the receipt location, preprocessing and OCR on an image file.
+
+    Args:
+        path (str): The image path.
+
+    Returns:
+        dict: The extracted text and the OCR statistics.
+    """
+    from PIL import Image
+
+    from meta_ai_api.ocr import ocr_receipt
+
+    with Image.open(path) as image:
+        text, stats = ocr_receipt(image)
+    return {"text": text, **stats}
+
+
+class Prompter:
+    """
+    Sends OCR text to Meta AI with one client per thread.
+    """
+
+    def __init__(
+        self, fb_email: str = None, fb_password: str = None, hedge: bool = False
+    ):
+        self.fb_email = fb_email
+        self.fb_password = fb_password
+        self.hedge = hedge
+        self._local = threading.local()
+
+    def __call__(self, text: str) -> Dict:
+        from meta_ai_api.main import MetaAI
+        from meta_ai_api.ocr import RECEIPT_PROMPT
+
+        if not hasattr(self._local, "ai"):
+            self._local.ai = MetaAI(
+                fb_email=self.fb_email, fb_password=self.fb_password, hedge=self.hedge
+            )
+        start = time.perf_counter()
+        resp = self._local.ai.prompt(message=text + RECEIPT_PROMPT, stream=False)
+        return {
+            "result": resp["message"],
+            "llm_seconds": round(time.perf_counter() - start, 4),
+        }
+
+
+def _ocr_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker)
+
+
+def run(args) -> Dict:
+    """
+    Processes every pending image of the inputs and appends the results to the output.
+
+    Returns:
+        dict: The counters of the throughput summary.
+    """
+    done = load_checkpoint(args.output, args.ocr_only)
+    paths = list(iter_inputs(args.inputs))
+    pending_paths = [path for path in paths if path not in done]
+    summary = {
+        "skipped": len(paths) - len(pending_paths),
+        "ok": 0,
+        "failed": 0,
+        "unprocessed": len(pending_paths),
+        "ocr": [],
+        "llm": [],
+    }
+    prompter = Prompter(args.fb_email, args.fb_password, args.hedge)
+    ocr_pool = _ocr_pool(args.workers)
+    # A dead worker breaks the whole pool without telling which image killed it: the
+    # images it was running are retried one at a time in a pool of their own.
+    suspects = deque()
+    isolation_pool = None
+    isolated = None
+
+    with open(args.output, "a", encoding="utf-8") as output, ThreadPoolExecutor(
+        max_workers=args.llm_concurrency
+    ) as llm_pool:
+
+        def write(record: Dict):
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            summary["failed" if "error" in record else "ok"] += 1
+            summary["unprocessed"] -= 1
+
+        pending = {}
+        queue = iter(pending_paths)
+
+        def restart_ocr_pool():
+            nonlocal ocr_pool
+            logging.warning("An OCR worker process died, restarting the pool.")
+            ocr_pool.shutdown(wait=False)
+            ocr_pool = _ocr_pool(args.workers)
+            for future, (stage, record) in list(pending.items()):
+                if stage != "ocr" or future is isolated:
+                    continue
+                # Results that made it out before the crash are still good.
+                if not future.done() or future.exception() is not None:
+                    del pending[future]
+                    suspects.append(record["path"])
+
+        def submit_ocr(path: str):
+            try:
+                future = ocr_pool.submit(ocr_file, path)
+            except BrokenProcessPool:
+                restart_ocr_pool()
+                future = ocr_pool.submit(ocr_file, path)
+            pending[future] = ("ocr", {"path": path})
+
+        def refill():
+            nonlocal isolation_pool, isolated
+            if isolated is None and suspects:
+                isolation_pool = isolation_pool or _ocr_pool(1)
+                path = suspects.popleft()
+                isolated = isolation_pool.submit(ocr_file, path)
+                pending[isolated] = ("ocr", {"path": path})
+            # Bound the submitted OCR work so a huge backfill does not queue every path at once.
+            in_flight = sum(
+                stage == "ocr" and future is not isolated
+                for future, (stage, _) in pending.items()
+            )
+            for _ in range(2 * args.workers - in_flight):
+                path = next(queue, None)
+                if path is None:
+                    return
+                submit_ocr(path)
+
+        try:
+            refill()
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future not in pending:
+                        # Handed to the suspects by restart_ocr_pool.
+                        continue
+                    stage, record = pending.pop(future)
+                    try:
+                        record.update(future.result())
+                    except BrokenProcessPool:
+                        if future is isolated:
+                            # Alone in its pool, so this image is what kills the worker.
+                            error = "OCR worker process died on this image"
+                            write({**record, "stage": stage, "error": error})
+                            isolation_pool.shutdown(wait=False)
+                            isolation_pool = None
+                        else:
+                            suspects.append(record["path"])
+                            restart_ocr_pool()
+                    except Exception as e:
+                        write({**record, "stage": stage, "error": str(e)})
+                    else:
+                        if stage == "llm":
+                            summary["llm"].append(record["llm_seconds"])
+                            write(record)
+                        else:
+                            summary["ocr"].append(record["ocr_seconds"])
+                            if args.ocr_only:
+                                write(record)
+                            else:
+                                pending[llm_pool.submit(prompter, record["text"])] = (
+                                    "llm",
+                                    record,
+                                )
+                    if stage == "ocr":
+                        if future is isolated:
+                            isolated = None
+                        refill()
+        finally:
+            ocr_pool.shutdown()
+            if isolation_pool is not None:
+                isolation_pool.shutdown()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m meta_ai_api.batch", description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="Directories, globs, images or manifests."
+    )
+    parser.add_argument(
+        "-o", "--output", required=True, help="JSONL file to append results to."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="OCR processes."
+    )
+    parser.add_argument(
+        "--llm-concurrency", type=int, default=4, help="Concurrent Meta AI clients."
+    )
+    parser.add_argument("--ocr-only", action="store_true", help="Skip the Meta AI step.")
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow Meta AI prompts.")
+    parser.add_argument("--fb-email", default=None)
+    parser.add_argument("--fb-password", default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = run(args)
+    elapsed = time.perf_counter() - start
+    processed = summary["ok"] + summary["failed"]
+    throughput = processed / elapsed if elapsed else 0.0
+    print(
+        f"{processed} images in {elapsed:.1f}s ({throughput:.2f} images/s): "
+        f"{summary['ok']} ok, {summary['failed']} failed, {summary['skipped']} already done, "
+        f"{summary['unprocessed']} not processed.",
+        file=sys.stderr,
+    )
+    for stage in ("ocr", "llm"):
+        if summary[stage]:
+            print(
+                f"{stage}: mean {statistics.mean(summary[stage]):.2f}s, "
+                f"max {max(summary[stage]):.2f}s per image",
+                file=sys.stderr,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,7 @@ class FacebookInvalidCredentialsException(Exception):
 
 class FacebookRegionBlocked(Exception):
     pass
+
+
+class MetaAITokensNotFound(Exception):
+    pass
@@ -0,0 +1,229 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from meta_ai_api.transport import Transport, abort
+
+
+class LatencyTracker:
+    """
+    Keeps a rolling window of latencies to derive percentiles from.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """
+        Args:
+            window (int): How many of the latest samples to keep.
+            min_samples (int): Below this many samples no percentile is reported.
+        """
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Args:
+            percentile (float): The percentile to compute, between 0 and 100.
+
+        Returns:
+            float: The latency at that percentile, or None if there are too few samples.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        rank = max(0, math.ceil(percentile / 100 * len(samples)) - 1)
+        return samples[rank]
+
+
+class HedgeBudget:
+    """
+    Token bucket limiting hedged requests to a fraction of the primary ones.
+    """
+
+    def __init__(self, ratio: float = 0.1, burst: float = 10.0):
+        """
+        Args:
+            ratio (float): Hedges allowed per primary request, e.g. 0.1 for at most 10% extra load.
+            burst (float): How many unused hedges may be saved up.
+        """
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        """
+        Records a primary request, which earns `ratio` of a hedge.
+        """
+        with self._lock:
+            self.requests += 1
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """
+        Returns:
+            bool: True if a hedge may be sent, in which case it is accounted for.
+        """
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            self.hedges += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "tokens": round(self.tokens, 2),
+            }
+
+
+class DedicatedTransports:
+    """
+    Keeps a few single-connection transports for prompt attempts. An attempt has its
+    transport to itself while it runs, so the connection can be shut down to cancel
+    it, and hands it back afterwards so later prompts skip the connection setup.
+    """
+
+    def __init__(self, proxy: Optional[dict] = None, size: int = 2):
+        """
+        Args:
+            proxy (dict): requests-style proxies, or None for direct connections.
+            size (int): How many idle transports to keep.
+        """
+        self.proxy = proxy
+        self.size = size
+        self.opened = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Transport:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            self.opened += 1
+        return Transport(proxy=self.proxy, pool_size=1)
+
+    def release(self, transport: Transport, reusable: bool):
+        """
+        Args:
+            transport (Transport): A transport returned by :meth:`acquire`.
+            reusable (bool): False if its connection was aborted or is in an unknown state.
+        """
+        if reusable:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(transport)
+                    return
+        transport.close()
+
+
+class PromptAttempt(threading.Thread):
+    """
+    Sends one prompt request and reads its stream until the final snapshot, so that
+    it can race other attempts and be cancelled when it loses.
+
+    Each attempt uses a connection of its own: streams multiplexed on a shared
+    connection cannot be reset individually, while a dedicated socket can be shut
+    down to stop the loser without touching the winner.
+    """
+
+    def __init__(
+        self,
+        transports: DedicatedTransports,
+        url: str,
+        headers: dict,
+        payload: str,
+        results,
+    ):
+        """
+        Args:
+            transports (DedicatedTransports): Where to take the connection of the attempt from.
+            url (str): The GraphQL endpoint.
+            headers (dict): The request headers.
+            payload (str): The url-encoded request body.
+            results (queue.Queue): Receives (attempt, raw response or None) when the attempt ends.
+        """
+        super().__init__(daemon=True)
+        self.transports = transports
+        self.url = url
+        self.headers = headers
+        self.payload = payload
+        self.results = results
+        self.first_line = threading.Event()
+        self.first_line_latency = None
+        self.started = time.monotonic()
+        self.cancelled = False
+        self.reported = False
+        self.response = None
+
+    def run(self):
+        transport = self.transports.acquire()
+        lines = []
+        reusable = False
+        try:
+            self.response = transport.post(
+                self.url, headers=self.headers, data=self.payload, stream=True
+            )
+            # cancel() may have run before there was a response to abort.
+            if self.cancelled:
+                return
+            stream = self.response.iter_lines()
+            for line in stream:
+                if self.cancelled:
+                    return
+                if not line:
+                    continue
+                if not self.first_line.is_set():
+                    self.first_line_latency = time.monotonic() - self.started
+                    self.first_line.set()
+                lines.append(line.decode("utf-8"))
+                if b'"OVERALL_DONE"' in line:
+                    break
+            # Answer first, then read the stream to its end so an HTTP/1.1
+            # connection can be reused.
+            self._report(lines)
+            for _ in stream:
+                if self.cancelled:
+                    return
+            reusable = True
+        except Exception:
+            # Covers the connection being shut down under us by cancel().
+            lines = None
+        finally:
+            self.first_line.set()
+            if self.response is not None:
+                self.response.close()
+            self.transports.release(transport, reusable and not self.cancelled)
+            self._report(lines)
+
+    def _report(self, lines):
+        if not self.cancelled and not self.reported:
+            self.reported = True
+            self.results.put((self, "\n".join(lines) if lines else None))
+
+    def cancel(self):
+        """
+        Stops the attempt without waiting for it: the connection is shut down and
+        the thread cleans up after itself.
+        """
+        self.cancelled = True
+        if self.response is not None:
+            abort(self.response)
@@ -1,38 +1,26 @@
 import json
 import logging
+import queue
 import time
 import urllib
 import uuid
 from typing import Dict, List, Generator, Iterator
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import requests
-from PIL import Image, ImageEnhance, ImageOps
-import pytesseract
-from io import BytesIO
-import requests
-from requests_html import HTMLSession
-import uvicorn
-from fastapi.middleware.cors import CORSMiddleware
-
-from utils import (
+
+
+from meta_ai_api.utils import (
     generate_offline_threading_id,
-    extract_value,
+    fetch_homepage_tokens,
     format_response,
 )
-from utils import get_fb_session, get_session
-from exceptions import FacebookRegionBlocked
-
-app = FastAPI()
-# Enable CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Adjust this to specify allowed origins
-    allow_credentials=True,
-    allow_methods=["*"],  # Allow all HTTP methods
-    allow_headers=["*"],  # Allow all headers
+from meta_ai_api.utils import get_fb_session
+from meta_ai_api.transport import get_transport
+from meta_ai_api.exceptions import FacebookRegionBlocked
+from meta_ai_api.hedging import (
+    DedicatedTransports,
+    HedgeBudget,
+    LatencyTracker,
+    PromptAttempt,
 )
-pytesseract.pytesseract.tesseract_cmd = '/usr/bin/tesseract'
 
 MAX_RETRIES = 3
 THREAD_ID="896da805-e5d7-43bc-8611-a042c9aaa880"
@@ -46,15 +34,33 @@ class MetaAI:
     """
 
     def __init__(
-        self, fb_email: str = None, fb_password: str = None, proxy: dict = None
+        self,
+        fb_email: str = None,
+        fb_password: str = None,
+        proxy: dict = None,
+        hedge: bool = False,
+        hedge_delay: float = 2.0,
+        hedge_percentile: float = 95,
+        hedge_budget: float = 0.1,
     ):
-        self.session = get_session()
-        self.session.headers.update(
-            {
-                "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
-                "(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-            }
-        )
+        """
+        Args:
+            fb_email (str): Facebook email, to prompt as an authenticated user.
+            fb_password (str): Facebook password.
+            proxy (dict): The proxies to send the requests through.
+            hedge (bool): Whether to race a second copy of slow non-streamed prompts.
+                The copy is sent in a new conversation, so only use it for one-shot prompts.
+                Hedged prompts run on a few connections kept by this client rather than
+                on the shared transport, so that a losing copy can be cut off.
+            hedge_delay (float): Seconds to wait for the first response line before
+                hedging, until enough latencies were seen to use `hedge_percentile`.
+            hedge_percentile (float): Percentile of the observed first-line latencies
+                after which a prompt is hedged.
+            hedge_budget (float): Maximum number of hedges per prompt, e.g. 0.1 for at
+                most 10% extra requests to Meta AI.
+        """
+        # Shared with every other client of the process, cookies are sent per request.
+        self.session = get_transport(proxy)
         self.access_token = None
         self.fb_email = fb_email
         self.fb_password = fb_password
@@ -65,6 +71,13 @@ class MetaAI:
         self.external_conversation_id = THREAD_ID
         self.offline_threading_id = None
 
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = HedgeBudget(hedge_budget)
+        self.hedge_transports = DedicatedTransports(proxy)
+        self.first_line_latency = LatencyTracker()
+
     def get_access_token(self) -> str:
         """
         Retrieves an access token using Meta's authentication API.
@@ -139,6 +152,43 @@ class MetaAI:
         Raises:
             Exception: If unable to obtain a valid response after several attempts.
         """
+        if not self.external_conversation_id or new_conversation:
+            external_id = str(uuid.uuid4())
+            self.external_conversation_id = external_id
+        if self.hedge and not stream:
+            return self.hedged_prompt(message, attempts=attempts)
+
+        url, headers, payload = self.build_prompt_request(
+            message, self.external_conversation_id
+        )
+        response = self.session.post(url, headers=headers, data=payload, stream=stream)
+        if not stream:
+            raw_response = response.text
+            last_streamed_response = self.extract_last_response(raw_response)
+            if not last_streamed_response:
+                return self.retry(message, stream=stream, attempts=attempts)
+
+            extracted_data = self.extract_data(last_streamed_response)
+            return extracted_data
+
+        else:
+            lines = response.iter_lines()
+            is_error = json.loads(next(lines))
+            if len(is_error.get("errors", [])) > 0:
+                return self.retry(message, stream=stream, attempts=attempts)
+            return self.stream_response(lines)
+
+    def build_prompt_request(self, message: str, external_conversation_id: str):
+        """
+        Builds the GraphQL request sending a message to a conversation.
+
+        Args:
+            message (str): The message to send.
+            external_conversation_id (str): The conversation to send it to.
+
+        Returns:
+            tuple: The url, headers and url-encoded payload of the request.
+        """
         if not self.is_authed:
             self.access_token = self.get_access_token()
             auth_payload = {"access_token": self.access_token}
@@ -148,9 +198,6 @@ class MetaAI:
             auth_payload = {"fb_dtsg": self.cookies["fb_dtsg"]}
             url = "https://www.meta.ai/api/graphql/"
 
-        if not self.external_conversation_id or new_conversation:
-            external_id = str(uuid.uuid4())
-            self.external_conversation_id = external_id
         payload = {
             **auth_payload,
             "fb_api_caller_class": "RelayModern",
@@ -158,7 +205,7 @@ class MetaAI:
             "variables": json.dumps(
                 {
                     "message": {"sensitive_string_value": message},
-                    "externalConversationId": self.external_conversation_id,
+                    "externalConversationId": external_conversation_id,
                     "offlineThreadingId": generate_offline_threading_id(),
                     "suggestedPromptIndex": None,
                     "flashVideoRecapInput": {"images": []},
@@ -180,26 +227,69 @@ class MetaAI:
         }
         if self.is_authed:
             headers["cookie"] = f'abra_sess={self.cookies["abra_sess"]}'
-            # Recreate the session to avoid cookie leakage when user is authenticated
-            self.session = requests.Session()
-            self.session.proxies = self.proxy
+        return url, headers, payload
 
-        response = self.session.post(url, headers=headers, data=payload, stream=stream)
-        if not stream:
-            raw_response = response.text
-            last_streamed_response = self.extract_last_response(raw_response)
-            if not last_streamed_response:
-                return self.retry(message, stream=stream, attempts=attempts)
+    def hedged_prompt(self, message: str, attempts: int = 0) -> Dict:
+        """
+        Sends a message and, if no response line arrived within the hedge delay, sends
+        it again in a new conversation. The first attempt to
+        finish its response wins and the other one is cancelled.
 
-            extracted_data = self.extract_data(last_streamed_response)
-            return extracted_data
+        Args:
+            message (str): The message to send.
+            attempts (int): The number of attempts to retry if an error occurs. Defaults to 0.
 
-        else:
-            lines = response.iter_lines()
-            is_error = json.loads(next(lines))
-            if len(is_error.get("errors", [])) > 0:
-                return self.retry(message, stream=stream, attempts=attempts)
-            return self.stream_response(lines)
+        Returns:
+            dict: A dictionary containing the response message and sources.
+        """
+        self.hedge_budget.deposit()
+        delay = self.first_line_latency.percentile(self.hedge_percentile)
+        results = queue.Queue()
+        running = [
+            PromptAttempt(
+                self.hedge_transports,
+                *self.build_prompt_request(message, self.external_conversation_id),
+                results,
+            )
+        ]
+        running[0].start()
+        if (
+            not running[0].first_line.wait(delay or self.hedge_delay)
+            and self.hedge_budget.try_spend()
+        ):
+            running.append(
+                PromptAttempt(
+                    self.hedge_transports,
+                    *self.build_prompt_request(message, str(uuid.uuid4())),
+                    results,
+                )
+            )
+            running[1].start()
+
+        last_streamed_response = winner = None
+        for _ in running:
+            attempt, raw_response = results.get()
+            if raw_response:
+                last_streamed_response = self.extract_last_response(raw_response)
+            if last_streamed_response:
+                winner = attempt
+                if attempt is not running[0]:
+                    self.hedge_budget.record_win()
+                break
+
+        now = time.monotonic()
+        for attempt in running:
+            if attempt.first_line_latency is not None:
+                self.first_line_latency.add(attempt.first_line_latency)
+            elif attempt.is_alive():
+                # Cancelled before its first line, which took at least this long.
+                self.first_line_latency.add(now - attempt.started)
+            # The winner finishes reading its stream so its connection can be reused.
+            if attempt is not winner:
+                attempt.cancel()
+        if not last_streamed_response:
+            return self.retry(message, stream=False, attempts=attempts)
+        return self.extract_data(last_streamed_response)
 
     def retry(self, message: str, stream: bool = False, attempts: int = 0):
         """
@@ -325,39 +415,19 @@ class MetaAI:
         Returns:
             dict: A dictionary containing essential cookies.
         """
-        session = HTMLSession()
-        # print(session,'session')
         headers = {}
+        names = ["_js_datr", "datr", "lsd", "fb_dtsg"]
         if self.fb_email is not None and self.fb_password is not None:
             
             # fb_session = get_fb_session(self.fb_email, self.fb_password)
             fb_session = {'datr': 'd2tAZx_2FrJ4kCj-dvKrE74X', 'fr': '0x3X6cTMlkBg9m4mT..BnQGt3..AAA.0.0.BnQGt3.AWXVCLdQb6I', 'ps_l': '1', 'ps_n': '1', 'sb': 'dWtAZyJtmIq5q14tmm7q-S51', 'abra_sess': COOKIE_TOKEN}
             headers = {"cookie": f"abra_sess={fb_session['abra_sess']}"}
-        response = session.get(
-            "https://www.meta.ai/",
-            headers=headers,
-        )
-        cookies = {
-            "_js_datr": extract_value(
-                response.text, start_str='_js_datr":{"value":"', end_str='",'
-            ),
-            "datr": extract_value(
-                response.text, start_str='datr":{"value":"', end_str='",'
-            ),
-            "lsd": extract_value(
-                response.text, start_str='"LSD",[],{"token":"', end_str='"}'
-            ),
-            "fb_dtsg": extract_value(
-                response.text, start_str='DTSGInitData",[],{"token":"', end_str='"'
-            ),
-        }
+        else:
+            names.append("abra_csrf")
+        cookies = fetch_homepage_tokens(self.session, names, headers=headers)
 
         if len(headers) > 0:
             cookies["abra_sess"] = fb_session["abra_sess"]
-        else:
-            cookies["abra_csrf"] = extract_value(
-                response.text, start_str='abra_csrf":{"value":"', end_str='",'
-            )
         return cookies
 
     def fetch_sources(self, fetch_id: str) -> List[Dict]:
@@ -405,122 +475,3 @@ class MetaAI:
         references = search_results["references"]
         return references
 
-
-def preprocess_image(image):
-    # Convert to grayscale
-    image = ImageOps.grayscale(image)
-    
-    # Increase contrast
-    enhancer = ImageEnhance.Contrast(image)
-    image = enhancer.enhance(2)  # Adjust the level as needed
-
-    # Resize image
-    image = image.resize((image.width * 2, image.height * 2), Image.LANCZOS)
-
-    # Binarize (Thresholding)
-    image = image.point(lambda x: 0 if x < 128 else 255, '1')
-
-    return image
-
-class ImageRequest(BaseModel):
-    image: str
-
-@app.get("/test")
-async def testingapi(request: ImageRequest):
-    print("testing the api")
-    return "api"
-    
-
-@app.post("/api/retrieve-text")
-async def retrieve_text(request: ImageRequest):
-    image_url = request.image
-    
-    try:
-        response = requests.get(image_url)
-        response.raise_for_status()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to retrieve image {e}")
-    
-    
-    try:
-        image = Image.open(BytesIO(response.content))
-        processed_image = preprocess_image(image)
-        config = "--oem 3"
-        extracted_text = pytesseract.image_to_string(processed_image, config=config, lang="eng")
-        # return {"result":extracted_text}
-        myprompt =  """  
-        
-                Convert it to json and and rephrase the product name to actual product name fix the product spellings and also give me a brand and manufactured of each product and
-                give me just json not any other text
-                example json structure below
-                {
-                "invoice_number": "163181DF2M59265259",
-                "store": "KH1 - MEGA - ZAMZAMA",
-                "ntn": "B353738",
-                "transaction_number": "235010133704",
-                "transaction_date": "Jun 2, 2024 1:59 PM",
-                "user": "61895-M Ahmed",
-                "pos": "KZMZ-SAL-POS-01-KZMZ-SAL-POS-01",
-                "items": [
-                {
-                "product_desc": "Cat Tisu Emotions 100x2ply Tissues",
-                "unit_price": "295.00",
-                "brand": "Cat Tisu",
-                "manufacturer":"",
-                "measurement_units": "pieces",
-                "price_per_unit": 995,
-                "quantity": 1,
-                "discount": 370,
-                "total_price": 625
-                }
-                ],
-                "total_items": 1,
-                "total_quantity": 1,
-                "discount":0,
-                "invoice_value": 625,
-                "gst": 100,
-                "payments": {
-                "method": "Keenu",
-                "amount": 625,
-                "card":"4659*********"
-                },
-                "change_due": "0.00",
-                "return_policy_url": "www.imtiaz.com.pk/return-policies"
-                }
-                """
-        # beforePrompt = """
-        #         You are a bot for api to extract the data from pictures like OCR you have to give me the product details json array of objects with measurement units dont include price unit
-        #             [{
-        #                 'store': store,
-        #                 'date': date,
-        #                 'brand': brand,
-        #                 'product_desc': product_desc,
-        #                 'measurement_units': measurement_units,
-        #                 'price_per_unit': price_per_unit,
-        #                 'quantity': quantity,
-        #                 'discount': discount,
-        #                 'total_price': total_price,
-        #             }]
-        #             in this structure for each and every product in the given text 
-        #         """
-        # extracted_text=beforePrompt+extracted_text+myprompt
-        extracted_text=extracted_text+myprompt
-        ai = MetaAI(fb_email="Email", fb_password="Password")
-        resp = ai.prompt(message=extracted_text, stream=False)
-        message = resp['message']
-        # message = extracted_text
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process image {e}")
-    
-    
-    return {"result": message}
-
-if __name__ == "__main__":
-    
-    # resp = ai.prompt(message="ae\n\nFBR Invoice #: 16318 1DF2M59265259\n\nKHL - MEGA - ZAMZAMA-\n\nNTN # B353738\n\nTransaction No.: 235010133704\nTransaction Date; Jun 2, 2024 1:59 PM\nUser: 61895-M Ahmed\n\npus KZMZ -SAL- PUS- Ol “KEME- -SAL-POS~ “OL\n\norigina a\n\nmee ae\n\nProduct Descript ion\n\n“Pakola Water 1500m)\n\n600 69,00 0.00  Rs414.00\ncat Tisu Emotions 100X2P ly\n1.00 995.00 0,00 R625 .00\n\nAxe Body Spray Musk 150m) -\n\n3.00 749.00 0.00 Rs2, 247.00\nClypso Bath Belt\n\n1.00 395.00 0.00 RS 395.00\nHankies Tisu Garden 150X2P ly\n\n3,00 249,00 0,00 RS 74700\nPerfect Air Frshnr Rfi1 Polo aul\n\n1,02 434 0 0.00 Rs439 .00\ntux BdyWet Uewy Sakura 500m]\n\n1.00 1195.00 0.00 Rs1, 155.06\nLndn Shn Shoe Shn Spng Nutr]\n\n1.00 335 010 0.00 Rs335.\n\nSor Storm Air Frehrir Rfil Lavendor >a0M\n1,00 675 0U (iti Rs525 00\nFBR POS Charges ™\n\n1.00 {ia G,00 Rs} .00\ntotal ‘Thems/tiuant ity 10/19.06\nDiscount Rs0 .00\nRounding Rs0 G0\n\nToice Vahe Fah BLD\n\nsale Tax Breakup\n\nExt. batt gs In}, Amt\nMRP Rs? 693.11 Rs522.89 Rs3 3,216.00\nNON MRP -Rs2, 755.38 Rs621. 62 Rs3,377.00\n\nPayments\n\nme we ce ET ne em wee mm\n\nKeen R56 , 593.00\nvhange Due Rs0. 00\n\n| MUL\n\nfor return 4 exchange policy details,\nVisit: www. imtiaz.com. ok/return-policies\n", stream=False)
-    # # meta = MetaAI()
-    # # resp = meta.prompt("How are you?", stream=False)
-    # # resp = meta.prompt("ae\n\nFBR Invoice #: 16318 1DF2M59265259\n\nKHL - MEGA - ZAMZAMA-\n\nNTN # B353738\n\nTransaction No.: 235010133704\nTransaction Date; Jun 2, 2024 1:59 PM\nUser: 61895-M Ahmed\n\npus KZMZ -SAL- PUS- Ol “KEME- -SAL-POS~ “OL\n\norigina a\n\nmee ae\n\nProduct Descript ion\n\n“Pakola Water 1500m)\n\n600 69,00 0.00  Rs414.00\ncat Tisu Emotions 100X2P ly\n1.00 995.00 0,00 R625 .00\n\nAxe Body Spray Musk 150m) -\n\n3.00 749.00 0.00 Rs2, 247.00\nClypso Bath Belt\n\n1.00 395.00 0.00 RS 395.00\nHankies Tisu Garden 150X2P ly\n\n3,00 249,00 0,00 RS 74700\nPerfect Air Frshnr Rfi1 Polo aul\n\n1,02 434 0 0.00 Rs439 .00\ntux BdyWet Uewy Sakura 500m]\n\n1.00 1195.00 0.00 Rs1, 155.06\nLndn Shn Shoe Shn Spng Nutr]\n\n1.00 335 010 0.00 Rs335.\n\nSor Storm Air Frehrir Rfil Lavendor >a0M\n1,00 675 0U (iti Rs525 00\nFBR POS Charges ™\n\n1.00 {ia G,00 Rs} .00\ntotal ‘Thems/tiuant ity 10/19.06\nDiscount Rs0 .00\nRounding Rs0 G0\n\nToice Vahe Fah BLD\n\nsale Tax Breakup\n\nExt. batt gs In}, Amt\nMRP Rs? 693.11 Rs522.89 Rs3 3,216.00\nNON MRP -Rs2, 755.38 Rs621. 62 Rs3,377.00\n\nPayments\n\nme we ce ET ne em wee mm\n\nKeen R56 , 593.00\nvhange Due Rs0. 00\n\n| MUL\n\nfor return 4 exchange policy details,\nVisit: www. imtiaz.com. ok/return-policies\n     convert it to json and just give me json not any single other message?", stream=False)
-    # message = resp['message']
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
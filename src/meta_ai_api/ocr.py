@@ -0,0 +1,459 @@
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import pytesseract
+from PIL import Image, ImageChops, ImageEnhance, ImageFilter, ImageOps
+
+pytesseract.pytesseract.tesseract_cmd = os.environ.get(
+    "TESSERACT_CMD", "/usr/bin/tesseract"
+)
+
+# Longest side of the thumbnail the receipt is located on.
+DETECT_SIZE = 800
+# Largest rotation, in degrees, that deskewing looks for.
+MAX_SKEW = 15
+# Crops covering less than this fraction of the photo are treated as failed detections.
+MIN_CROP_RATIO = 0.02
+
+# Shortest strip worth its own tesseract run, in preprocessed (2x) pixels.
+MIN_STRIP_HEIGHT = 600
+# Rows a strip cut through text extends into its neighbours, so the cut line is whole in one.
+STRIP_OVERLAP = 40
+# Rows whose share of white pixels is at least this are gaps between text lines.
+BLANK_ROW_FILL = 0.995
+
+RECEIPT_PROMPT = """  
+        
+                Convert it to json and and rephrase the product name to actual product name fix the product spellings and also give me a brand and manufactured of each product and
+                give me just json not any other text
+                example json structure below
+                {
+                "invoice_number": "163181DF2M59265259",
+                "store": "KH1 - MEGA - ZAMZAMA",
+                "ntn": "B353738",
+                "transaction_number": "235010133704",
+                "transaction_date": "Jun 2, 2024 1:59 PM",
+                "user": "61895-M Ahmed",
+                "pos": "KZMZ-SAL-POS-01-KZMZ-SAL-POS-01",
+                "items": [
+                {
+                "product_desc": "Cat Tisu Emotions 100x2ply Tissues",
+                "unit_price": "295.00",
+                "brand": "Cat Tisu",
+                "manufacturer":"",
+                "measurement_units": "pieces",
+                "price_per_unit": 995,
+                "quantity": 1,
+                "discount": 370,
+                "total_price": 625
+                }
+                ],
+                "total_items": 1,
+                "total_quantity": 1,
+                "discount":0,
+                "invoice_value": 625,
+                "gst": 100,
+                "payments": {
+                "method": "Keenu",
+                "amount": 625,
+                "card":"4659*********"
+                },
+                "change_due": "0.00",
+                "return_policy_url": "www.imtiaz.com.pk/return-policies"
+                }
+                """
+
+
+def preprocess_image(image):
+    # Convert to grayscale
+    image = ImageOps.grayscale(image)
+    
+    # Increase contrast
+    enhancer = ImageEnhance.Contrast(image)
+    image = enhancer.enhance(2)  # Adjust the level as needed
+
+    # Resize image
+    image = image.resize((image.width * 2, image.height * 2), Image.LANCZOS)
+
+    # Binarize (Thresholding)
+    image = image.point(lambda x: 0 if x < 128 else 255, '1')
+
+    return image
+
+
+def _otsu_threshold(image) -> int:
+    histogram = image.histogram()[:256]
+    total = sum(histogram)
+    weighted_total = sum(value * count for value, count in enumerate(histogram))
+    best_threshold, best_variance = 128, -1.0
+    background = weighted_background = 0
+    for value, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += value * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = value, variance
+    return best_threshold
+
+
+def _mask(image, threshold: int, dark: bool):
+    if dark:
+        return image.point(lambda x: 255 if x <= threshold else 0)
+    return image.point(lambda x: 255 if x > threshold else 0)
+
+
+def _profile(mask, rows: bool) -> List[float]:
+    # A box downscale to a single column (or row) averages every row (or column).
+    size = (1, mask.height) if rows else (mask.width, 1)
+    return [value / 255 for value in mask.resize(size, Image.BOX).getdata()]
+
+
+def _span(profile: List[float], min_fill: float) -> Tuple[int, int]:
+    filled = [i for i, fill in enumerate(profile) if fill >= min_fill and fill > 0]
+    if not filled:
+        return 0, 0
+    return filled[0], filled[-1] + 1
+
+
+def _bbox(mask, min_fill: float, relative: bool = False) -> Tuple[int, int, int, int]:
+    rows, columns = _profile(mask, rows=True), _profile(mask, rows=False)
+    top, bottom = _span(rows, min_fill * max(rows) if relative else min_fill)
+    left, right = _span(columns, min_fill * max(columns) if relative else min_fill)
+    return left, top, right, bottom
+
+
+def _fill_spans(mask):
+    # Sets every row to white from its first to its last white pixel, which fills the
+    # holes the text leaves in a convex shape such as a (rotated) sheet of paper.
+    width, data = mask.width, mask.tobytes()
+    filled = bytearray(len(data))
+    for start in range(0, len(data), width):
+        row = data[start : start + width]
+        left, right = row.find(255), row.rfind(255)
+        if left != -1:
+            filled[start + left : start + right + 1] = b"\xff" * (right - left + 1)
+    return Image.frombytes("L", mask.size, bytes(filled))
+
+
+def _paper_ink(paper):
+    """
+    Masks the ink on the paper crop, leaving out the background the crop takes in
+    around a rotated receipt, which would otherwise count as ink.
+    """
+    bright = _mask(paper, _otsu_threshold(paper), dark=False)
+    rows = _fill_spans(bright)
+    columns = _fill_spans(bright.transpose(Image.TRANSPOSE)).transpose(
+        Image.TRANSPOSE
+    )
+    # Step inside the edges, whose blend of paper and background reads as ink.
+    sheet = ImageChops.darker(rows, columns).filter(ImageFilter.MinFilter(5))
+    ink = _mask(paper, _otsu_threshold(paper), dark=True)
+    return ImageChops.darker(ink, sheet)
+
+
+def _find_paper(thumb) -> Tuple[int, int, int, int]:
+    # The paper fills the rows and columns it spans far more than bright clutter
+    # around it, whatever share of the photo it takes.
+    left, top, right, bottom = _bbox(
+        _mask(thumb, _otsu_threshold(thumb), dark=False), 0.5, relative=True
+    )
+    # Step inside the edges so slivers of background along them are not taken for ink.
+    inset_x = min((right - left) // 100 + 2, (right - left) // 4)
+    inset_y = min((bottom - top) // 100 + 2, (bottom - top) // 4)
+    return left + inset_x, top + inset_y, right - inset_x, bottom - inset_y
+
+
+def _border_color(image) -> int:
+    border = [
+        image.crop(box)
+        for box in (
+            (0, 0, image.width, 1),
+            (0, image.height - 1, image.width, image.height),
+            (0, 0, 1, image.height),
+            (image.width - 1, 0, image.width, image.height),
+        )
+    ]
+    histogram = [sum(counts) for counts in zip(*(b.histogram() for b in border))]
+    half, seen = sum(histogram) / 2, 0
+    for value, count in enumerate(histogram):
+        seen += count
+        if seen >= half:
+            return value
+    return 0
+
+
+def _skew_score(ink, angle: float) -> float:
+    rows = _profile(ink.rotate(angle, Image.BILINEAR, expand=True), rows=True)
+    return sum((below - above) ** 2 for above, below in zip(rows, rows[1:]))
+
+
+def estimate_skew(ink) -> float:
+    """
+    Estimates the rotation that makes the text lines horizontal.
+
+    Text lines give the sharpest row profile (dense rows separated by empty gaps)
+    when they are level, so the angle maximising the squared differences between
+    neighbouring rows wins. Unlike the variance of the profile, this also rejects
+    angles where the lines of two columns only line up with each other.
+
+    Args:
+        ink (PIL.Image.Image): Mask with ink pixels at 255 and paper at 0.
+
+    Returns:
+        float: The angle in degrees to rotate the image by (counter-clockwise).
+    """
+    scale = min(1.0, 400 / max(ink.size))
+    if scale < 1.0:
+        # Line spacing survives a box downscale, which keeps the angle search cheap.
+        ink = ink.resize(
+            (max(1, round(ink.width * scale)), max(1, round(ink.height * scale))),
+            Image.BOX,
+        )
+    best = max(range(-MAX_SKEW, MAX_SKEW + 1), key=lambda a: _skew_score(ink, a))
+    fine = [best + step / 10 for step in range(-10, 11)]
+    return max(fine, key=lambda a: _skew_score(ink, a))
+
+
+def locate_receipt(image) -> Tuple["Image.Image", Dict]:
+    """
+    Finds the receipt in a photo, deskews it and crops it to its text block.
+
+    The paper is located as the bright region of the photo and the text block as
+    the ink inside it, on a thumbnail, before the crop is applied to the full image.
+
+    Args:
+        image (PIL.Image.Image): The receipt photo.
+
+    Returns:
+        tuple: The cropped grayscale image and a dictionary with the skew ``angle``,
+        the crop ``box`` in the deskewed image, the ``psm`` to run tesseract with and
+        the ``area_ratio`` of the crop to the original photo.
+    """
+    gray = ImageOps.grayscale(image)
+    scale = min(1.0, DETECT_SIZE / max(gray.size))
+    thumb = gray.resize(
+        (max(1, round(gray.width * scale)), max(1, round(gray.height * scale))),
+        Image.BOX,
+    )
+    info = {"angle": 0.0, "box": (0, 0) + gray.size, "psm": 3, "area_ratio": 1.0}
+
+    paper_box = _find_paper(thumb)
+    paper = thumb.crop(paper_box)
+    if paper.width < 2 or paper.height < 2:
+        return gray, info
+    ink = _paper_ink(paper)
+    angle = estimate_skew(ink)
+    if abs(angle) >= 0.3:
+        gray = gray.rotate(angle, Image.BICUBIC, expand=True, fillcolor=255)
+        # Fill the corners uncovered by the rotation with the background of the photo.
+        thumb = thumb.rotate(
+            angle, Image.BICUBIC, expand=True, fillcolor=_border_color(thumb)
+        )
+        paper_box = _find_paper(thumb)
+        paper = thumb.crop(paper_box)
+        ink = _paper_ink(paper)
+
+    # Dilate so characters merge into lines and isolated specks stay below the fill.
+    left, top, right, bottom = _bbox(ink.filter(ImageFilter.MaxFilter(5)), 0.01)
+    margin = 4
+    box = (
+        max(0, round((paper_box[0] + left - margin) / scale)),
+        max(0, round((paper_box[1] + top - margin) / scale)),
+        min(gray.width, round((paper_box[0] + right + margin) / scale)),
+        min(gray.height, round((paper_box[1] + bottom + margin) / scale)),
+    )
+    width, height = box[2] - box[0], box[3] - box[1]
+    area_ratio = width * height / (image.width * image.height)
+    if width <= 0 or height <= 0 or area_ratio < MIN_CROP_RATIO:
+        return ImageOps.grayscale(image), info
+
+    info.update(
+        angle=round(angle, 2),
+        box=box,
+        # Receipts are a single column of lines of varying size.
+        psm=4 if height >= 1.5 * width else 6,
+        area_ratio=round(min(area_ratio, 1.0), 4),
+    )
+    return gray.crop(box), info
+
+
+def split_strips(
+    image, strip_height: int, overlap: int = STRIP_OVERLAP
+) -> Tuple[List, List[bool]]:
+    """
+    Splits a tall binarized receipt into horizontal strips, cutting in the blank gaps
+    between text lines closest to every multiple of `strip_height`.
+
+    Args:
+        image (PIL.Image.Image): The preprocessed receipt.
+        strip_height (int): The target height of the strips.
+        overlap (int): Rows each strip extends into its neighbours.
+
+    Returns:
+        tuple: The strips from top to bottom, and for every boundary between two
+        strips whether it was cut through text, so that both strips read its lines.
+    """
+    rows = _profile(image.convert("L"), rows=True)
+    # Middle and half height of every run of blank rows, the safest places to cut.
+    gaps, run_start = [], None
+    for y, fill in enumerate(rows + [0.0]):
+        if fill >= BLANK_ROW_FILL and run_start is None:
+            run_start = y
+        elif fill < BLANK_ROW_FILL and run_start is not None:
+            gaps.append(((run_start + y) // 2, (y - run_start) // 2))
+            run_start = None
+
+    # (row, margin): a cut in a gap only extends into the blank rows around it, a cut
+    # through text extends by the full overlap so the cut lines are whole in a strip.
+    cuts, through_text = [(0, 0)], []
+    while image.height - cuts[-1][0] > strip_height + strip_height // 2:
+        target = cuts[-1][0] + strip_height
+        window = [gap for gap in gaps if abs(gap[0] - target) <= strip_height // 4]
+        if window:
+            row, half = min(window, key=lambda gap: abs(gap[0] - target))
+            cuts.append((row, min(overlap, half)))
+        else:
+            cuts.append((target, overlap))
+        through_text.append(not window)
+    cuts.append((image.height, 0))
+
+    strips = [
+        image.crop(
+            (
+                0,
+                max(0, top - top_margin),
+                image.width,
+                min(image.height, bottom + bottom_margin),
+            )
+        )
+        for (top, top_margin), (bottom, bottom_margin) in zip(cuts, cuts[1:])
+    ]
+    return strips, through_text
+
+
+def stitch_strips(
+    texts: List[str], overlapping: List[bool], max_overlap_lines: int = 5
+) -> str:
+    """
+    Joins the text of consecutive strips, dropping the lines the overlap read twice.
+
+    Only boundaries cut through text can repeat lines: anywhere else, matching lines
+    are genuinely repeated on the receipt (identical items, rules) and are kept.
+
+    Args:
+        texts (list): The text of every strip, from top to bottom.
+        overlapping (list): Whether each boundary between two strips was cut through
+            text, as returned by :func:`split_strips`.
+        max_overlap_lines (int): The most lines two neighbouring strips can share.
+
+    Returns:
+        str: The text of the whole receipt.
+    """
+
+    def normalize(line: str) -> str:
+        return "".join(line.split())
+
+    lines = []
+    for text, overlaps in zip(texts, [False] + list(overlapping)):
+        new_lines = text.strip("\n").splitlines()
+        if not overlaps:
+            lines.extend(new_lines)
+            continue
+        kept = [normalize(line) for line in lines if line.strip()]
+        fresh = [normalize(line) for line in new_lines if line.strip()]
+        repeated = 0
+        for count in range(1, min(len(kept), len(fresh), max_overlap_lines) + 1):
+            if kept[-count:] == fresh[:count]:
+                repeated = count
+        # Skip the repeated non-empty lines and any blank lines among them.
+        while repeated and new_lines:
+            if new_lines.pop(0).strip():
+                repeated -= 1
+        lines.extend(new_lines)
+    return "\n".join(lines) + "\n"
+
+
+def ocr_strips(image, config: str, workers: int) -> Tuple[str, int]:
+    """
+    Runs tesseract on strips of a tall receipt in parallel and stitches their text.
+
+    Each strip gets its own tesseract process, so threads are enough to keep the
+    cores busy. Set OMP_THREAD_LIMIT=1 in the environment of the process so that
+    tesseract's OpenMP threads do not oversubscribe the cores.
+
+    Args:
+        image (PIL.Image.Image): The preprocessed receipt.
+        config (str): The tesseract configuration.
+        workers (int): How many strips to run at once.
+
+    Returns:
+        tuple: The text and the number of strips.
+    """
+    strip_height = max(MIN_STRIP_HEIGHT, math.ceil(image.height / workers))
+    strips, overlapping = split_strips(image, strip_height)
+    with ThreadPoolExecutor(max_workers=min(workers, len(strips))) as pool:
+        texts = list(
+            pool.map(
+                lambda strip: pytesseract.image_to_string(
+                    strip, config=config, lang="eng"
+                ),
+                strips,
+            )
+        )
+    return stitch_strips(texts, overlapping), len(strips)
+
+
+def ocr_receipt(image, workers: int = 1) -> Tuple[str, Dict]:
+    """
+    Locates the receipt in a photo and runs the preprocessing and tesseract on it.
+
+    Args:
+        image (PIL.Image.Image): The receipt photo.
+        workers (int): Tesseract processes to split a tall receipt across. Defaults to 1.
+
+    Returns:
+        tuple: The extracted text and the statistics of :func:`locate_receipt`,
+        with ``strips``, ``locate_seconds`` and ``ocr_seconds`` added.
+    """
+    start = time.perf_counter()
+    receipt, stats = locate_receipt(image)
+    processed_image = preprocess_image(receipt)
+    located = time.perf_counter()
+    config = f"--oem 3 --psm {stats['psm']}"
+    if workers > 1 and processed_image.height >= 2 * MIN_STRIP_HEIGHT:
+        text, stats["strips"] = ocr_strips(processed_image, config, workers)
+    else:
+        text = pytesseract.image_to_string(processed_image, config=config, lang="eng")
+        stats["strips"] = 1
+    stats["locate_seconds"] = round(located - start, 4)
+    stats["ocr_seconds"] = round(time.perf_counter() - located, 4)
+    logging.info(
+        f"OCR on {stats['area_ratio']:.0%} of the photo (skew {stats['angle']} deg, "
+        f"psm {stats['psm']}, {stats['strips']} strips) took {stats['ocr_seconds']:.2f}s."
+    )
+    return text, stats
+
+
+def image_to_text(image, workers: int = 1) -> str:
+    """
+    Runs the receipt preprocessing and tesseract on an image.
+
+    Args:
+        image (PIL.Image.Image): The receipt photo.
+        workers (int): Tesseract processes to split a tall receipt across. Defaults to 1.
+
+    Returns:
+        str: The text extracted by tesseract.
+    """
+    return ocr_receipt(image, workers=workers)[0]
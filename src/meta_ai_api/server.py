@@ -0,0 +1,292 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from io import BytesIO
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from PIL import Image
+from pydantic import BaseModel
+
+from meta_ai_api.admission import AdmissionRejected, Bulkhead
+from meta_ai_api.main import MetaAI
+from meta_ai_api.ocr import RECEIPT_PROMPT, image_to_text
+from meta_ai_api.transport import abort, get_transport
+
+
+# The lsd/fb_dtsg tokens scraped by the client expire, so it is rebuilt periodically
+# and after consecutive failed prompts.
+CLIENT_TTL = float(os.environ.get("META_AI_CLIENT_TTL", 1800))
+MAX_PROMPT_FAILURES = int(os.environ.get("META_AI_MAX_PROMPT_FAILURES", 3))
+_meta_ai_lock = threading.Lock()
+
+
+def get_meta_ai() -> MetaAI:
+    """
+    Returns the Meta AI client shared by the requests of this worker, creating it
+    (and scraping its cookies) if the warm-up could not, or if it is older than
+    META_AI_CLIENT_TTL seconds or was dropped by :func:`report_prompt`.
+    """
+    with _meta_ai_lock:
+        expired = time.monotonic() - app.state.meta_ai_created > CLIENT_TTL
+        if app.state.meta_ai is None or expired:
+            app.state.meta_ai = MetaAI(
+                fb_email="Email",
+                fb_password="Password",
+                hedge=os.environ.get("META_AI_HEDGE", "0") == "1",
+            )
+            app.state.meta_ai_created = time.monotonic()
+            app.state.meta_ai_failures = 0
+            app.state.warmup["meta_ai"] = True
+        return app.state.meta_ai
+
+
+def report_prompt(ai: MetaAI, ok: bool):
+    """
+    Records the outcome of a prompt, dropping the client after META_AI_MAX_PROMPT_FAILURES
+    consecutive failures so the next request scrapes fresh tokens.
+    """
+    with _meta_ai_lock:
+        if app.state.meta_ai is not ai:
+            return
+        if ok:
+            app.state.meta_ai_failures = 0
+            return
+        app.state.meta_ai_failures += 1
+        if app.state.meta_ai_failures >= MAX_PROMPT_FAILURES:
+            logging.warning("Meta AI prompts keep failing, refreshing the client.")
+            app.state.meta_ai = None
+            app.state.warmup["meta_ai"] = False
+
+
+def download_image(url: str, deadline: float) -> bytes:
+    """
+    Downloads an image, giving up once the request deadline has passed so slow or
+    stalled servers cannot hold download slots indefinitely.
+    """
+    timeout = max(deadline - time.monotonic(), 1.0)
+    chunks = []
+    # Over HTTP/1.1, aborting a download cannot take the others down with it.
+    transport = get_transport(http2=False)
+    with transport.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        # Per-read timeouts do not bound a server that drips bytes, the watchdog does.
+        watchdog = threading.Timer(
+            max(deadline - time.monotonic(), 0), abort, [response]
+        )
+        watchdog.start()
+        try:
+            for chunk in response.iter_content(65536):
+                chunks.append(chunk)
+        except Exception:
+            if time.monotonic() < deadline:
+                raise
+        finally:
+            watchdog.cancel()
+    # An aborted read may also surface as a quiet end of stream.
+    if time.monotonic() >= deadline:
+        raise TimeoutError("the download outlived the request deadline")
+    return b"".join(chunks)
+
+
+def warm_up_ocr():
+    try:
+        # Registers the JPEG/PNG/... plugins and loads eng.traineddata from disk.
+        Image.init()
+        image_to_text(Image.new("L", (64, 64), 255))
+        app.state.warmup["ocr"] = True
+    except Exception as e:
+        logging.warning(f"OCR warm-up failed: {e}")
+
+
+def warm_up():
+    """
+    Does the one-off work of the first request before the worker reports ready: the
+    image codecs, the tesseract traineddata load and the Meta AI credentials.
+    A failing OCR step is retried by /ready and cleared by the first successful OCR
+    request, a failing Meta AI step by the first request that needs the client.
+    """
+    warm_up_ocr()
+
+    try:
+        ai = get_meta_ai()
+        if not ai.is_authed:
+            ai.access_token = ai.get_access_token()
+    except Exception as e:
+        logging.warning(f"Meta AI warm-up failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.meta_ai = None
+    app.state.meta_ai_created = 0.0
+    app.state.meta_ai_failures = 0
+    app.state.warmup = {"ocr": False, "meta_ai": False}
+    app.state.request_timeout = float(os.environ.get("META_AI_REQUEST_TIMEOUT", 60))
+    app.state.ocr_workers = int(os.environ.get("META_AI_OCR_TILE_WORKERS", 1))
+    # The OCR stage and the strips provide the parallelism, one OpenMP thread per
+    # tesseract process keeps them from oversubscribing the cores.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    max_waiting = int(os.environ.get("META_AI_MAX_WAITING", 32))
+    app.state.stages = {
+        name: Bulkhead(name, int(os.environ.get(variable, default)), max_waiting)
+        for name, variable, default in (
+            ("download", "META_AI_DOWNLOAD_CONCURRENCY", 16),
+            (
+                "ocr",
+                "META_AI_OCR_CONCURRENCY",
+                max(1, (os.cpu_count() or 1) // app.state.ocr_workers),
+            ),
+            ("llm", "META_AI_LLM_CONCURRENCY", 4),
+        )
+    }
+    await run_in_threadpool(warm_up)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+# Enable CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust this to specify allowed origins
+    allow_credentials=True,
+    allow_methods=["*"],  # Allow all HTTP methods
+    allow_headers=["*"],  # Allow all headers
+)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request, exc: AdmissionRejected):
+    return JSONResponse(
+        {"detail": exc.detail},
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+class ImageRequest(BaseModel):
+    image: str
+
+@app.get("/test")
+async def testingapi(request: ImageRequest):
+    print("testing the api")
+    return "api"
+
+
+@app.get("/ready")
+async def ready():
+    if not app.state.warmup["ocr"]:
+        await run_in_threadpool(warm_up_ocr)
+    is_ready = all(app.state.warmup.values())
+    return JSONResponse(
+        {"ready": is_ready, "checks": app.state.warmup},
+        status_code=200 if is_ready else 503,
+    )
+
+
+@app.get("/stats")
+async def stats():
+    stages = {name: stage.stats() for name, stage in app.state.stages.items()}
+    if app.state.meta_ai is not None:
+        stages["hedging"] = app.state.meta_ai.hedge_budget.stats()
+    stages["transport"] = get_transport().stats()
+    stages["download_transport"] = get_transport(http2=False).stats()
+    return stages
+    
+
+@app.post("/api/retrieve-text")
+async def retrieve_text(request: ImageRequest):
+    image_url = request.image
+    deadline = time.monotonic() + app.state.request_timeout
+    stages = app.state.stages
+    
+    async with stages["download"].slot(deadline):
+        try:
+            content = await run_in_threadpool(download_image, image_url, deadline)
+        except TimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Failed to retrieve image {e}")
+    
+    
+    try:
+        async with stages["ocr"].slot(deadline):
+            image = Image.open(BytesIO(content))
+            extracted_text = await run_in_threadpool(
+                image_to_text, image, workers=app.state.ocr_workers
+            )
+            app.state.warmup["ocr"] = True
+        # return {"result":extracted_text}
+        # beforePrompt = """
+        #         You are a bot for api to extract the data from pictures like OCR you have to give me the product details json array of objects with measurement units dont include price unit
+        #             [{
+        #                 'store': store,
+        #                 'date': date,
+        #                 'brand': brand,
+        #                 'product_desc': product_desc,
+        #                 'measurement_units': measurement_units,
+        #                 'price_per_unit': price_per_unit,
+        #                 'quantity': quantity,
+        #                 'discount': discount,
+        #                 'total_price': total_price,
+        #             }]
+        #             in this structure for each and every product in the given text 
+        #         """
+        # extracted_text=beforePrompt+extracted_text+myprompt
+        extracted_text=extracted_text+RECEIPT_PROMPT
+        async with stages["llm"].slot(deadline):
+            ai = await run_in_threadpool(get_meta_ai)
+            try:
+                resp = await run_in_threadpool(
+                    ai.prompt, message=extracted_text, stream=False
+                )
+            except Exception:
+                report_prompt(ai, ok=False)
+                raise
+            report_prompt(ai, ok=True)
+        message = resp['message']
+        # message = extracted_text
+    
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to process image {e}")
+    
+    
+    return {"result": message}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receipt OCR API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (defaults to $WEB_CONCURRENCY or 1).",
+    )
+    parser.add_argument(
+        "--reload",
+        action="store_true",
+        help="Development mode: a single worker restarted on code changes.",
+    )
+    args = parser.parse_args()
+
+    if args.reload:
+        uvicorn.run("meta_ai_api.server:app", host=args.host, port=args.port, reload=True)
+    else:
+        # Each worker warms up before it accepts connections, and in-flight requests get
+        # time to finish on shutdown, so rolling restarts do not show up as latency spikes.
+        uvicorn.run(
+            "meta_ai_api.server:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            timeout_graceful_shutdown=30,
+        )
@@ -0,0 +1,342 @@
+import functools
+import http.cookiejar
+import socket
+import threading
+from collections import Counter
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Connection-specific headers, which HTTP/2 forbids.
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-connection",
+    "transfer-encoding",
+    "upgrade",
+}
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+)
+
+
+def _import_httpx():
+    """
+    Imports httpx when the first HTTP/2 transport is created rather than with the
+    package, since httpx and h2 take longer to import than everything else.
+
+    Returns:
+        module: httpx, or None when httpx or h2 is not installed.
+    """
+    try:
+        import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is installed)
+        import httpx
+    except ImportError:
+        return None
+    return httpx
+
+
+class _RejectAllCookies(http.cookiejar.DefaultCookiePolicy):
+    def set_ok(self, cookie, request):
+        return False
+
+
+class HTTPXResponse:
+    """
+    Gives an httpx response the parts of the requests API used in this package.
+    """
+
+    def __init__(self, response):
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def iter_content(self, chunk_size: Optional[int] = None):
+        return self._response.iter_bytes(chunk_size)
+
+    def iter_lines(self):
+        for line in self._response.iter_lines():
+            yield line.encode("utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._response.close()
+
+
+class Transport:
+    """
+    HTTP client shared by every MetaAI instance and helper of the process.
+
+    Connections are pooled per host and kept alive, multiplexed over HTTP/2 when
+    httpx and h2 are installed (``pip install meta-ai-api[http2]``) and over
+    HTTP/1.1 keep-alive with requests otherwise. Cookies are never stored on the
+    client: each request carries its own, so callers can share connections without
+    sharing sessions.
+    """
+
+    def __init__(
+        self, proxy: Optional[Dict] = None, http2: bool = True, pool_size: int = 16
+    ):
+        """
+        Args:
+            proxy (dict): requests-style proxies, e.g. {"https": "http://host:port"}.
+            http2 (bool): Use HTTP/2 when httpx and h2 are available.
+            pool_size (int): Connections kept alive per host.
+        """
+        self.headers = CaseInsensitiveDict({"user-agent": USER_AGENT})
+        self.proxy = proxy
+        self._requests = Counter()
+        self._connections = Counter()
+        self._lock = threading.Lock()
+
+        httpx = _import_httpx() if http2 else None
+        if httpx is not None:
+            self.backend = "httpx"
+            self._httpx = httpx
+            proxy_url = (proxy or {}).get("https") or (proxy or {}).get("http")
+            self._client = httpx.Client(
+                http2=True,
+                proxy=proxy_url,
+                cookies=http.cookiejar.CookieJar(policy=_RejectAllCookies()),
+                limits=httpx.Limits(
+                    max_connections=None, max_keepalive_connections=pool_size
+                ),
+                # Streamed answers can take a while, only bound the connection setup.
+                timeout=httpx.Timeout(None, connect=10.0),
+            )
+        else:
+            self.backend = "requests"
+            self._client = requests.Session()
+            self._client.cookies.set_policy(_RejectAllCookies())
+            self._client.proxies = proxy or {}
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self._client.mount("https://", adapter)
+            self._client.mount("http://", adapter)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict] = None,
+        cookies: Optional[Dict] = None,
+        data=None,
+        params: Optional[Dict] = None,
+        stream: bool = False,
+        allow_redirects: bool = True,
+        timeout: Optional[float] = None,
+    ):
+        """
+        Sends a request on a pooled connection.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to send the request to.
+            headers (dict): Headers added to (or, when None, removed from) the default ones.
+            cookies (dict): Cookies sent with this request only.
+            data (dict or str): The form fields or the encoded body.
+            params (dict): The query string parameters.
+            stream (bool): Whether to return before the body is downloaded.
+            allow_redirects (bool): Whether to follow redirects.
+            timeout (float): Timeout in seconds.
+
+        Returns:
+            requests.Response or HTTPXResponse: The response.
+        """
+        merged = CaseInsensitiveDict(self.headers)
+        merged.update(headers or {})
+        if cookies:
+            cookie_header = "; ".join(f"{k}={v}" for k, v in cookies.items())
+            if merged.get("cookie"):
+                cookie_header = f'{merged["cookie"].rstrip("; ")}; {cookie_header}'
+            merged["cookie"] = cookie_header
+        headers = {name: value for name, value in merged.items() if value is not None}
+
+        host = urlsplit(url).netloc
+        with self._lock:
+            self._requests[host] += 1
+
+        if self.backend == "requests":
+            return self._client.request(
+                method,
+                url,
+                headers=headers,
+                data=data,
+                params=params,
+                stream=stream,
+                allow_redirects=allow_redirects,
+                timeout=timeout,
+            )
+
+        headers = {
+            name: value
+            for name, value in headers.items()
+            if name.lower() not in HOP_BY_HOP_HEADERS
+        }
+        body = {"content": data} if isinstance(data, (str, bytes)) else {"data": data}
+        if timeout is None:
+            timeout = self._httpx.USE_CLIENT_DEFAULT
+        request = self._client.build_request(
+            method,
+            url,
+            headers=headers,
+            params=params,
+            timeout=timeout,
+            extensions={"trace": functools.partial(self._trace, host)},
+            **body,
+        )
+        response = self._client.send(
+            request, stream=stream, follow_redirects=allow_redirects
+        )
+        return HTTPXResponse(response)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        """
+        Closes every pooled connection.
+        """
+        self._client.close()
+
+    def _trace(self, host: str, event: str, info: dict):
+        # httpcore only connects when no pooled connection (or HTTP/2 stream slot) is free.
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self._connections[host] += 1
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Reports how often requests reused an open connection, per host.
+
+        Returns:
+            dict: For each host, the number of requests, of connections opened and the reuse rate.
+        """
+        with self._lock:
+            requests_per_host = dict(self._requests)
+            connections = dict(self._connections)
+        if self.backend == "requests":
+            connections = {}
+            for adapter in self._client.adapters.values():
+                # Proxied requests are pooled by the proxy managers, per target host
+                # for HTTPS tunnels.
+                managers = [adapter.poolmanager, *adapter.proxy_manager.values()]
+                for manager in managers:
+                    pools = manager.pools
+                    for key in pools.keys():
+                        pool = pools.get(key)
+                        if pool is None:
+                            continue
+                        host = pool.host
+                        if pool.port not in (80, 443, None):
+                            host = f"{pool.host}:{pool.port}"
+                        connections[host] = (
+                            connections.get(host, 0) + pool.num_connections
+                        )
+        stats = {}
+        for host, count in requests_per_host.items():
+            opened = connections.get(host, 0)
+            stats[host] = {
+                "requests": count,
+                "connections": opened,
+                "reuse_rate": round(max(0.0, 1 - opened / count), 3) if count else 0.0,
+            }
+        return stats
+
+
+def abort(response):
+    """
+    Shuts down the socket a streamed response is read from, so a thread blocked
+    reading it returns at once instead of waiting for the next byte (closing the
+    response from another thread waits for that read to finish).
+
+    Over HTTP/2 this ends every stream multiplexed on the connection, so it is meant
+    for responses of an HTTP/1.1 transport (``get_transport(http2=False)``) or of a
+    transport of their own.
+
+    Args:
+        response (requests.Response or HTTPXResponse): A response sent with stream=True.
+    """
+    if isinstance(response, HTTPXResponse):
+        stream = response.extensions.get("network_stream")
+        sock = stream.get_extra_info("socket") if stream is not None else None
+    else:
+        connection = getattr(response.raw, "_connection", None)
+        sock = getattr(connection, "sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        # Already closed.
+        pass
+
+
+# Fetched through a proxy before its transport is first handed out.
+PROXY_TEST_URL = "https://api.ipify.org/?format=json"
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(proxy: Optional[Dict] = None, http2: bool = True) -> Transport:
+    """
+    Returns the process-wide transport for a proxy configuration, creating it on first use.
+
+    Args:
+        proxy (dict): requests-style proxies, or None for direct connections.
+        http2 (bool): False for a transport that keeps every response on a connection
+            of its own, so that it can be stopped with :func:`abort`.
+
+    Returns:
+        Transport: The shared transport.
+
+    Raises:
+        Exception: If the proxy cannot fetch PROXY_TEST_URL.
+    """
+    key = (tuple(sorted((proxy or {}).items())), http2)
+    with _transports_lock:
+        if key not in _transports:
+            transport = Transport(proxy=proxy, http2=http2)
+            if proxy:
+                _check_proxy(transport)
+            _transports[key] = transport
+        return _transports[key]
+
+
+def _check_proxy(transport: Transport):
+    # Fails fast on a broken proxy rather than halfway through scraping the cookies.
+    try:
+        response = transport.get(PROXY_TEST_URL, timeout=10)
+    except Exception as e:
+        transport.close()
+        raise Exception("Proxy is not working.") from e
+    if response.status_code != 200:
+        transport.close()
+        raise Exception("Proxy is not working.")
+
+
+def collect_cookies(response) -> Dict[str, str]:
+    """
+    Gathers the cookies set by a response and by the redirects that led to it.
+
+    Args:
+        response (requests.Response or HTTPXResponse): The final response.
+
+    Returns:
+        dict: The cookies by name, later responses overriding earlier ones.
+    """
+    cookies = {}
+    for hop in list(response.history) + [response]:
+        cookies.update(dict(hop.cookies))
+    return cookies
@@ -1,13 +1,24 @@
+import codecs
 import logging
 import random
+import re
 import time
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional, Tuple
 
-from requests_html import HTMLSession
-import requests
-from bs4 import BeautifulSoup
+from meta_ai_api.exceptions import (
+    FacebookInvalidCredentialsException,
+    MetaAITokensNotFound,
+)
+from meta_ai_api.transport import Transport, collect_cookies, get_transport
 
-from exceptions import FacebookInvalidCredentialsException
+# Start and end markers of the tokens embedded in the https://www.meta.ai/ page.
+HOMEPAGE_TOKENS = {
+    "_js_datr": ('_js_datr":{"value":"', '",'),
+    "datr": ('datr":{"value":"', '",'),
+    "lsd": ('"LSD",[],{"token":"', '"}'),
+    "fb_dtsg": ('DTSGInitData",[],{"token":"', '"'),
+    "abra_csrf": ('abra_csrf":{"value":"', '",'),
+}
 
 
 def generate_offline_threading_id() -> str:
@@ -42,6 +53,116 @@ def generate_offline_threading_id() -> str:
     return str(threading_id)
 
 
+class TokenScanner:
+    """
+    Finds the values between several start/end markers in a single pass over text
+    that arrives in chunks, keeping only the unscanned tail of the text in memory.
+    """
+
+    def __init__(self, markers: Dict[str, Tuple[str, str]]):
+        """
+        Args:
+            markers (dict): Maps each token name to its (start_str, end_str) markers.
+        """
+        self.markers = markers
+        self.values = {}
+        self._names = {start_str: name for name, (start_str, _) in markers.items()}
+        # A lookahead matches at every position, so overlapping markers such as
+        # 'datr' inside '_js_datr' are all found, each at its first occurrence.
+        starts = sorted(self._names, key=len, reverse=True)
+        self._pattern = re.compile(
+            "(?=(%s))" % "|".join(re.escape(start_str) for start_str in starts)
+        )
+        self._keep = max(len(start_str) for start_str in starts) - 1
+        self._buffer = ""
+        self._offset = 0
+        # Tokens whose start marker was seen but not yet their end marker:
+        # name -> (value start, position to resume looking for the end marker).
+        self._pending = {}
+
+    @property
+    def done(self) -> bool:
+        return len(self.values) == len(self.markers)
+
+    def feed(self, text: str) -> bool:
+        """
+        Scans the next chunk of text.
+
+        Args:
+            text (str): The next chunk.
+
+        Returns:
+            bool: True once every token has been found.
+        """
+        buffer = self._buffer + text
+        for name, (start, search_from) in list(self._pending.items()):
+            self._resolve(buffer, name, start, search_from)
+
+        for match in self._pattern.finditer(buffer, self._offset):
+            name = self._names[match.group(1)]
+            if name not in self.values and name not in self._pending:
+                self._resolve(buffer, name, match.end(1), match.end(1))
+
+        # Keep enough of the tail for a marker split across chunks, and everything
+        # from the start of a value that is still waiting for its end marker.
+        frontier = max(len(buffer) - self._keep, 0)
+        cut = min([frontier] + [start for start, _ in self._pending.values()])
+        self._buffer = buffer[cut:]
+        self._offset = frontier - cut
+        self._pending = {
+            name: (start - cut, search_from - cut)
+            for name, (start, search_from) in self._pending.items()
+        }
+        return self.done
+
+    def _resolve(self, buffer: str, name: str, start: int, search_from: int):
+        end_str = self.markers[name][1]
+        end = buffer.find(end_str, search_from)
+        if end == -1:
+            self._pending[name] = (start, max(len(buffer) - len(end_str) + 1, start))
+        else:
+            self._pending.pop(name, None)
+            self.values[name] = buffer[start:end]
+
+    def finish(self) -> Dict[str, str]:
+        """
+        Returns the extracted values.
+
+        Raises:
+            MetaAITokensNotFound: If any of the tokens was not found.
+        """
+        missing = [name for name in self.markers if name not in self.values]
+        if missing:
+            raise MetaAITokensNotFound(
+                f"Unable to find {', '.join(missing)} in the response from Meta AI. "
+                "Meta may have changed the page or your region may be blocked."
+            )
+        return dict(self.values)
+
+
+def extract_values(
+    chunks: Iterable[str], markers: Dict[str, Tuple[str, str]]
+) -> Dict[str, str]:
+    """
+    Extracts several values from text in a single pass, stopping as soon as all are found.
+
+    Args:
+        chunks (Iterable[str]): The text, possibly split into chunks.
+        markers (dict): Maps each value name to its (start_str, end_str) markers.
+
+    Returns:
+        dict: The extracted values keyed by name.
+
+    Raises:
+        MetaAITokensNotFound: If any of the markers is missing.
+    """
+    scanner = TokenScanner(markers)
+    for chunk in chunks:
+        if scanner.feed(chunk):
+            break
+    return scanner.finish()
+
+
 def extract_value(text: str, start_str: str, end_str: str) -> str:
     """
     Helper function to extract a specific value from the given text using a key.
@@ -53,10 +174,38 @@ def extract_value(text: str, start_str: str, end_str: str) -> str:
 
     Returns:
         str: The extracted value.
+
+    Raises:
+        MetaAITokensNotFound: If either key is missing.
+    """
+    return extract_values([text], {start_str: (start_str, end_str)})[start_str]
+
+
+def fetch_homepage_tokens(
+    session: Transport, names: Iterable[str], headers: Optional[Dict] = None
+) -> Dict[str, str]:
+    """
+    Streams the Meta AI main page and extracts the requested tokens, closing the
+    download as soon as all of them have been seen.
+
+    Args:
+        session (Transport): The transport to send the request with.
+        names (Iterable[str]): Keys of HOMEPAGE_TOKENS to extract.
+        headers (dict): Extra request headers.
+
+    Returns:
+        dict: The extracted tokens keyed by name.
+
+    Raises:
+        MetaAITokensNotFound: If any of the tokens is missing from the page.
     """
-    start = text.find(start_str) + len(start_str)
-    end = text.find(end_str, start)
-    return text[start:end]
+    markers = {name: HOMEPAGE_TOKENS[name] for name in names}
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with session.get("https://www.meta.ai/", headers=headers, stream=True) as response:
+        chunks = (
+            decoder.decode(chunk) for chunk in response.iter_content(chunk_size=16384)
+        )
+        return extract_values(chunks, markers)
 
 
 def format_response(response: dict) -> str:
@@ -83,7 +232,8 @@ def format_response(response: dict) -> str:
 
 # Function to perform the login
 def get_fb_session(email, password, proxies=None):
-    
+    from bs4 import BeautifulSoup
+
     print(email,password,'-----------LOGIUN')
     login_url = "https://www.facebook.com/login/?next"
     headers = {
@@ -101,7 +251,8 @@ def get_fb_session(email, password, proxies=None):
         "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
     }
     # Send the GET request
-    response = requests.get(login_url, headers=headers, proxies=proxies)
+    transport = get_transport(proxies)
+    response = transport.get(login_url, headers=headers)
     soup = BeautifulSoup(response.text, "html.parser")
 
     # Parse necessary parameters from the login form
@@ -140,15 +291,9 @@ def get_fb_session(email, password, proxies=None):
         "Priority": "u=0, i",
     }
 
-    from requests import cookies
-
     # Send the POST request
-    session = requests.session()
-    jar = cookies.RequestsCookieJar()
-    session.proxies = proxies
-    session.cookies = jar
-
-    result = session.post(post_url, headers=headers, data=data)
+    result = transport.post(post_url, headers=headers, data=data)
+    jar = collect_cookies(result)
     if "sb" not in jar or "xs" not in jar:
         raise FacebookInvalidCredentialsException(
             "Was not able to login to Facebook. Please check your credentials. "
@@ -156,7 +301,7 @@ def get_fb_session(email, password, proxies=None):
         )
 
     cookies = {
-        **result.cookies.get_dict(),
+        **dict(result.cookies),
         "sb": jar["sb"],
         "xs": jar["xs"],
         "fr": jar["fr"],
@@ -168,7 +313,7 @@ def get_fb_session(email, password, proxies=None):
         "headers": result.headers,
         "response": response.text,
     }
-    meta_ai_cookies = get_cookies()
+    meta_ai_cookies = get_cookies(transport)
 
     url = "https://www.meta.ai/state/"
 
@@ -188,15 +333,12 @@ def get_fb_session(email, password, proxies=None):
         "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
     }
 
-    response = requests.request(
-        "POST", url, headers=headers, data=payload, proxies=proxies
-    )
+    response = transport.post(url, headers=headers, data=payload)
 
     state = extract_value(response.text, start_str='"state":"', end_str='"')
 
 
     url = f"https://www.facebook.com/oidc/?app_id=1358015658191005&scope=openid%20linking&response_type=code&redirect_uri=https%3A%2F%2Fwww.meta.ai%2Fauth%2F&no_universal_links=1&deoia=1&state={state}"
-    payload = {}
     headers = {
         "authority": "www.facebook.com",
         "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
@@ -210,15 +352,13 @@ def get_fb_session(email, password, proxies=None):
         "upgrade-insecure-requests": "1",
         "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
     }
-    session = requests.session()
-    session.proxies = proxies
-    response = session.get(url, headers=headers, data=payload, allow_redirects=False)
+    response = transport.get(url, headers=headers, allow_redirects=False)
+    cookies = collect_cookies(response)
 
     next_url = response.headers["Location"]
   
     url = next_url
 
-    payload = {}
     headers = {
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:125.0) Gecko/20100101 Firefox/125.0",
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
@@ -234,8 +374,8 @@ def get_fb_session(email, password, proxies=None):
         "Sec-Fetch-User": "?1",
         "TE": "trailers",
     }
-    session.get(url, headers=headers, data=payload)
-    cookies = session.cookies.get_dict()
+    response = transport.get(url, headers=headers)
+    cookies.update(collect_cookies(response))
     cookies['abra_sess'] = 'Fqz98dCNnsEBFlQYDmoxNXp2SVJndWpfbXpnFpKg%2BvMMAA%3D%3D'
     if "abra_sess" not in cookies:
         raise FacebookInvalidCredentialsException(
@@ -246,50 +386,16 @@ def get_fb_session(email, password, proxies=None):
     return cookies
 
 
-def get_cookies() -> dict:
+def get_cookies(session: Optional[Transport] = None) -> dict:
     """
     Extracts necessary cookies from the Meta AI main page.
 
-    Returns:
-        dict: A dictionary containing essential cookies.
-    """
-    session = HTMLSession()
-    response = session.get("https://www.meta.ai/")
-    return {
-        "_js_datr": extract_value(
-            response.text, start_str='_js_datr":{"value":"', end_str='",'
-        ),
-        "abra_csrf": extract_value(
-            response.text, start_str='abra_csrf":{"value":"', end_str='",'
-        ),
-        "datr": extract_value(
-            response.text, start_str='datr":{"value":"', end_str='",'
-        ),
-        "lsd": extract_value(
-            response.text, start_str='"LSD",[],{"token":"', end_str='"}'
-        ),
-    }
-
-
-def get_session(
-    proxy: Optional[Dict] = None, test_url: str = "https://api.ipify.org/?format=json"
-) -> requests.Session:
-    """
-    Get a session with the proxy set.
-
     Args:
-        proxy (Dict): The proxy to use
-        test_url (str): A test site from which we check that the proxy is installed correctly.
+        session (Transport): The transport to use. Defaults to the shared one.
 
     Returns:
-        requests.Session: A session with the proxy set.
+        dict: A dictionary containing essential cookies.
     """
-    session = requests.Session()
-    if not proxy:
-        return session
-    response = session.get(test_url, proxies=proxy, timeout=10)
-    if response.status_code == 200:
-        session.proxies = proxy
-        return session
-    else:
-        raise Exception("Proxy is not working.")
+    return fetch_homepage_tokens(
+        session or get_transport(), ["_js_datr", "abra_csrf", "datr", "lsd"]
+    )
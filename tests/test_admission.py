@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+from meta_ai_api.admission import AdmissionRejected, Bulkhead
+
+
+async def hold(stage: Bulkhead, seconds: float, deadline: float = 10.0, running=None):
+    async with stage.slot(time.monotonic() + deadline):
+        if running is not None:
+            running.append(stage.in_flight)
+        await asyncio.sleep(seconds)
+    return "ok"
+
+
+def test_same_tick_arrivals_are_counted():
+    async def scenario():
+        stage = Bulkhead("ocr", limit=2, max_waiting=2)
+        results = await asyncio.gather(
+            *(hold(stage, 0.05) for _ in range(6)), return_exceptions=True
+        )
+        return stage, results
+
+    stage, results = asyncio.run(scenario())
+    assert results.count("ok") == 4
+    rejected = [r for r in results if isinstance(r, AdmissionRejected)]
+    assert [r.status_code for r in rejected] == [429, 429]
+    assert stage.rejected == 2
+    assert (stage.admitted, stage.in_flight, stage.waiting) == (0, 0, 0)
+
+
+def test_never_runs_more_than_the_limit():
+    async def scenario():
+        stage = Bulkhead("llm", limit=3, max_waiting=20)
+        running = []
+        await asyncio.gather(*(hold(stage, 0.01, running=running) for _ in range(20)))
+        return running
+
+    assert max(asyncio.run(scenario())) == 3
+
+
+def test_rejects_a_wait_that_would_overrun_the_deadline():
+    async def scenario():
+        stage = Bulkhead("ocr", limit=1, max_waiting=10)
+        stage.service_time = 5.0
+        busy = asyncio.ensure_future(hold(stage, 0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await hold(stage, 0, deadline=1.0)
+        await busy
+        return stage, rejected.value
+
+    stage, rejected = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert rejected.retry_after == 5
+    assert stage.admitted == 0
+
+
+def test_times_out_waiting_for_a_slot():
+    async def scenario():
+        stage = Bulkhead("download", limit=1, max_waiting=10)
+        # Predicts a short wait, but the slot is held for longer than the deadline.
+        stage.service_time = 0.01
+        busy = asyncio.ensure_future(hold(stage, 0.5))
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await hold(stage, 0, deadline=0.1)
+        waited = time.monotonic() - start
+        await busy
+        return stage, rejected.value, waited
+
+    stage, rejected, waited = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert waited < 0.4
+    assert (stage.admitted, stage.in_flight) == (0, 0)
+
+
+def test_cancelled_waiter_gives_its_place_back():
+    async def scenario():
+        stage = Bulkhead("llm", limit=1, max_waiting=1)
+        busy = asyncio.ensure_future(hold(stage, 0.2))
+        waiter = asyncio.ensure_future(hold(stage, 0))
+        await asyncio.sleep(0.05)
+        assert stage.waiting == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert stage.waiting == 0
+        # The queue has room again and the slot is still usable afterwards.
+        assert await hold(stage, 0) == "ok"
+        await busy
+        return stage
+
+    stage = asyncio.run(scenario())
+    assert (stage.admitted, stage.in_flight) == (0, 0)
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import time
+
+import pytest
+
+from meta_ai_api import batch
+
+
+def fake_ocr(path: str) -> dict:
+    name = os.path.basename(path)
+    if name.startswith("poison"):
+        # Like tesseract or Pillow taking the worker process down.
+        os._exit(1)
+    if name.startswith("bad"):
+        raise ValueError("cannot identify image file")
+    time.sleep(0.02)
+    return {"text": f"text of {name}", "ocr_seconds": 0.02}
+
+
+class FakePrompter:
+    def __init__(self, *args):
+        pass
+
+    def __call__(self, text: str) -> dict:
+        return {"result": text.upper(), "llm_seconds": 0.0}
+
+
+@pytest.fixture(autouse=True)
+def fakes(monkeypatch):
+    monkeypatch.setattr(batch, "ocr_file", fake_ocr)
+    monkeypatch.setattr(batch, "Prompter", FakePrompter)
+
+
+def images(directory, **counts):
+    for prefix, count in counts.items():
+        for i in range(count):
+            (directory / f"{prefix}{i:02}.png").write_bytes(b"")
+
+
+def run(directory, ocr_only=False, workers=2):
+    args = argparse.Namespace(
+        inputs=[str(directory / "images")],
+        output=str(directory / "out.jsonl"),
+        workers=workers,
+        llm_concurrency=2,
+        ocr_only=ocr_only,
+        hedge=False,
+        fb_email=None,
+        fb_password=None,
+    )
+    return batch.run(args)
+
+
+def records(directory):
+    with open(directory / "out.jsonl", encoding="utf-8") as output:
+        return [json.loads(line) for line in output]
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    (tmp_path / "images").mkdir()
+    return tmp_path
+
+
+def test_failures_do_not_shrink_the_window(workdir):
+    images(workdir / "images", bad=20, ok=5)
+    summary = run(workdir, ocr_only=True, workers=1)
+    assert (summary["ok"], summary["failed"], summary["unprocessed"]) == (5, 20, 0)
+    assert len(records(workdir)) == 25
+
+
+@pytest.mark.parametrize("attempt", range(3))
+def test_only_the_image_killing_its_worker_fails(workdir, attempt):
+    images(workdir / "images", ok=12, poison=1, bad=2)
+    summary = run(workdir, ocr_only=True)
+    assert (summary["ok"], summary["failed"], summary["unprocessed"]) == (12, 3, 0)
+    errors = {
+        os.path.basename(r["path"]): r["error"] for r in records(workdir) if "error" in r
+    }
+    assert set(errors) == {"poison00.png", "bad00.png", "bad01.png"}
+    assert "died" in errors["poison00.png"]
+
+
+def test_resume_skips_only_finished_images(workdir):
+    images(workdir / "images", ok=4, bad=1)
+    assert run(workdir)["ok"] == 4
+    summary = run(workdir)
+    # The failed image is retried, the others are skipped.
+    assert (summary["skipped"], summary["failed"]) == (4, 1)
+
+
+def test_full_run_prompts_images_from_an_ocr_only_run(workdir):
+    images(workdir / "images", ok=3)
+    run(workdir, ocr_only=True)
+    assert run(workdir, ocr_only=True)["skipped"] == 3
+
+    summary = run(workdir)
+    assert (summary["skipped"], summary["ok"]) == (0, 3)
+    assert all("result" in r for r in records(workdir)[3:])
+    assert run(workdir)["skipped"] == 3
@@ -0,0 +1,139 @@
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from meta_ai_api import main, transport
+from meta_ai_api.hedging import DedicatedTransports, PromptAttempt
+
+DONE_LINE = json.dumps(
+    {
+        "data": {
+            "node": {
+                "bot_response_message": {
+                    "streaming_state": "OVERALL_DONE",
+                    "composed_text": {"content": [{"text": "hello"}]},
+                }
+            }
+        }
+    }
+).encode()
+
+
+class Upstream(BaseHTTPRequestHandler):
+    """
+    /stall answers the headers and then never sends a line, /fast answers at once.
+    """
+
+    protocol_version = "HTTP/1.1"
+    released = threading.Event()
+    stalled = threading.Event()
+    connections = set()
+
+    def do_POST(self):
+        self.connections.add(self.client_address)
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        if self.path == "/fast":
+            self.send_header("Content-Length", str(len(DONE_LINE) + 1))
+            self.end_headers()
+            self.wfile.write(DONE_LINE + b"\n")
+            return
+        self.send_header("Content-Length", "100000")
+        self.end_headers()
+        self.wfile.flush()
+        self.stalled.set()
+        self.released.wait(30)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    Upstream.released.clear()
+    Upstream.stalled.clear()
+    Upstream.connections.clear()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    Upstream.released.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["httpx", "requests"])
+def backend(request, monkeypatch):
+    if request.param == "requests":
+        monkeypatch.setattr(transport, "_import_httpx", lambda: None)
+    return request.param
+
+
+def test_cancel_stops_a_stalled_attempt(upstream, backend):
+    results = queue.Queue()
+    transports = DedicatedTransports()
+    attempt = PromptAttempt(transports, f"{upstream}/stall", {}, "q=1", results)
+    attempt.start()
+    assert Upstream.stalled.wait(5)
+
+    start = time.monotonic()
+    attempt.cancel()
+    assert time.monotonic() - start < 0.5
+    attempt.join(2)
+    assert not attempt.is_alive()
+    assert results.empty()
+    # The aborted connection is not handed to a later attempt.
+    assert transports._idle == []
+
+
+def hedging_client(upstream, monkeypatch, paths):
+    monkeypatch.setattr(main.MetaAI, "get_cookies", lambda self: {})
+    ai = main.MetaAI(hedge=True, hedge_delay=0.2)
+    paths = iter(paths)
+    monkeypatch.setattr(
+        ai,
+        "build_prompt_request",
+        lambda message, conversation_id: (f"{upstream}{next(paths)}", {}, "q=1"),
+    )
+    return ai
+
+
+def wait_idle(transports, count):
+    # Attempts hand their connection back after the answer was returned.
+    deadline = time.monotonic() + 2
+    while len(transports._idle) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_prompts_reuse_their_connection(upstream, backend, monkeypatch):
+    ai = hedging_client(upstream, monkeypatch, ["/fast"] * 3)
+    for _ in range(3):
+        assert ai.prompt("hi")["message"] == "hello\n"
+        wait_idle(ai.hedge_transports, 1)
+    assert ai.hedge_transports.opened == 1
+    assert len(Upstream.connections) == 1
+
+
+def test_hedge_wins_over_a_stalled_primary(upstream, backend, monkeypatch):
+    ai = hedging_client(upstream, monkeypatch, ["/stall", "/fast", "/fast"])
+    ai.hedge_budget.tokens = 1
+
+    start = time.monotonic()
+    response = ai.prompt("hi")
+    assert time.monotonic() - start < 2
+    assert response["message"] == "hello\n"
+    assert ai.hedge_budget.stats()["hedge_wins"] == 1
+    # The cancelled primary counts with the time it was waited for.
+    assert len(ai.first_line_latency._samples) == 2
+    assert min(ai.first_line_latency._samples) < max(ai.first_line_latency._samples)
+
+    # Only the winner's connection is kept, and the next prompt runs on it.
+    wait_idle(ai.hedge_transports, 1)
+    assert ai.prompt("hi")["message"] == "hello\n"
+    assert ai.hedge_transports.opened == 2
+    assert len(Upstream.connections) == 2
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from meta_ai_api.ocr import (
+    STRIP_OVERLAP,
+    locate_receipt,
+    split_strips,
+    stitch_strips,
+)
+
+
+def receipt(lines: int = 25, width: int = 500) -> Image.Image:
+    """
+    A synthetic receipt: item names on the left and prices on the right.
+    """
+    rng = random.Random(lines)
+    paper = Image.new("L", (width, 40 * lines + 80), 235)
+    draw = ImageDraw.Draw(paper)
+    for i in range(lines):
+        y = 40 + 40 * i
+        draw.text((30, y), f"ITEM {i}  QTY {rng.randint(1, 9)}", fill=30)
+        draw.text((width - 90, y), f"{rng.randint(10, 999)}.00", fill=30)
+    return paper
+
+
+def photo(angle: float, background: int) -> Image.Image:
+    """
+    The receipt rotated by `angle` and lying on a uniform background.
+    """
+    paper = receipt().convert("RGBA").rotate(angle, Image.BICUBIC, expand=True)
+    canvas = Image.new("L", (paper.width + 400, paper.height + 400), background)
+    canvas.paste(paper.convert("L"), (200, 200), paper)
+    return canvas
+
+
+@pytest.mark.parametrize("angle", [-14, -12, -7, -2, 2, 5, 12, 14])
+@pytest.mark.parametrize("background", [60, 128])
+def test_deskews_a_receipt_on_a_dark_background(angle, background):
+    _, info = locate_receipt(photo(angle, background))
+    assert info["angle"] == pytest.approx(-angle, abs=0.5)
+    assert info["area_ratio"] < 0.8
+
+
+@pytest.mark.parametrize("angle", [-12, 2, 14])
+def test_deskews_a_full_frame_scan(angle):
+    _, info = locate_receipt(receipt().rotate(angle, Image.BICUBIC, fillcolor=235))
+    assert info["angle"] == pytest.approx(-angle, abs=0.5)
+
+
+def test_leaves_a_straight_receipt_alone():
+    cropped, info = locate_receipt(photo(0, 60))
+    assert info["angle"] == 0.0
+    # The crop holds the text block and not the table around it.
+    assert cropped.width < receipt().width
+    assert cropped.height < receipt().height
+
+
+def lined(height: int, line_pitch: int = 40, line_height: int = 20) -> Image.Image:
+    """
+    A binarized page with a black bar for every text line.
+    """
+    page = Image.new("1", (300, height), 1)
+    draw = ImageDraw.Draw(page)
+    for top in range(10, height - line_height, line_pitch):
+        draw.rectangle((10, top, 290, top + line_height - 1), fill=0)
+    return page
+
+
+def test_split_cuts_in_the_gaps_between_lines():
+    page = lined(2400)
+    strips, through_text = split_strips(page, 600)
+    assert len(strips) == 4
+    assert through_text == [False, False, False]
+    # Cuts in a gap do not read any line twice.
+    assert sum(strip.height for strip in strips) < page.height + 3 * STRIP_OVERLAP
+
+
+def test_split_through_text_overlaps_the_neighbours():
+    # A single block of text: no gap to cut in.
+    page = Image.new("1", (300, 2400), 0)
+    strips, through_text = split_strips(page, 600)
+    assert through_text == [True] * (len(strips) - 1)
+    assert sum(strip.height for strip in strips) == page.height + 2 * STRIP_OVERLAP * (
+        len(strips) - 1
+    )
+
+
+def test_stitch_drops_lines_read_twice_at_a_text_cut():
+    texts = ["TOTAL\n1.00 249.00\n", "1.00 249.00\nCASH 300.00\n"]
+    assert stitch_strips(texts, [True]) == "TOTAL\n1.00 249.00\nCASH 300.00\n"
+
+
+def test_stitch_keeps_repeated_lines_at_a_gap_cut():
+    texts = ["TOTAL\n1.00 249.00\n", "1.00 249.00\nX\n"]
+    assert stitch_strips(texts, [False]) == "TOTAL\n1.00 249.00\n1.00 249.00\nX\n"
+    rules = ["ITEMS\n---\n", "---\nTOTAL\n"]
+    assert stitch_strips(rules, [False]) == "ITEMS\n---\n---\nTOTAL\n"
+
+
+def test_stitch_ignores_spacing_and_blank_lines_in_the_overlap():
+    texts = ["A\nB  1.00\n\nC\n", "B 1.00\nC\n\nD\n"]
+    assert stitch_strips(texts, [True]) == "A\nB  1.00\n\nC\n\nD\n"
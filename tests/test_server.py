@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from meta_ai_api import server
+from meta_ai_api.transport import get_transport
+
+IMAGE = b"\x89PNG" + b"x" * 200_000
+
+
+class Images(BaseHTTPRequestHandler):
+    """
+    /drip sends a few bytes every 100ms, /slow the whole image over 1.5s and /image
+    answers at once.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(IMAGE)))
+        self.end_headers()
+        if self.path == "/image":
+            self.wfile.write(IMAGE)
+            return
+        step = 10 if self.path == "/drip" else len(IMAGE) // 15 + 1
+        try:
+            for start in range(0, len(IMAGE), step):
+                self.wfile.write(IMAGE[start : start + step])
+                self.wfile.flush()
+                time.sleep(0.1)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def images():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Images)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download(images):
+    assert server.download_image(f"{images}/image", time.monotonic() + 5) == IMAGE
+
+
+def test_dripping_download_stops_at_the_deadline(images):
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        server.download_image(f"{images}/drip", time.monotonic() + 1)
+    assert time.monotonic() - start < 2
+
+
+def test_aborted_download_leaves_the_others_alone(images):
+    with ThreadPoolExecutor(2) as pool:
+        image = pool.submit(server.download_image, f"{images}/slow", time.monotonic() + 5)
+        drip = pool.submit(server.download_image, f"{images}/drip", time.monotonic() + 0.5)
+        with pytest.raises(TimeoutError):
+            drip.result()
+        assert image.result() == IMAGE
+    # Downloads never share a connection, whatever backends are installed.
+    assert get_transport(http2=False).backend == "requests"
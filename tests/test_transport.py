@@ -0,0 +1,60 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from meta_ai_api import transport
+
+
+class ForwardProxy(BaseHTTPRequestHandler):
+    """
+    Answers every proxied request itself, recording the URLs it was asked for.
+    """
+
+    protocol_version = "HTTP/1.1"
+    seen = []
+
+    def do_GET(self):
+        self.seen.append(self.path)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def proxy(monkeypatch):
+    ForwardProxy.seen = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ForwardProxy)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    monkeypatch.setattr(transport, "PROXY_TEST_URL", "http://proxy-check.test/")
+    monkeypatch.setattr(transport, "_transports", {})
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_proxy_is_checked_once(proxy):
+    proxies = {"http": proxy, "https": proxy}
+    first = transport.get_transport(proxies)
+    assert transport.get_transport(proxies) is first
+    assert ForwardProxy.seen == ["http://proxy-check.test/"]
+
+
+def test_broken_proxy_fails_fast(monkeypatch):
+    monkeypatch.setattr(transport, "_transports", {})
+    # Nothing listens on the discard port.
+    proxies = {"http": "http://127.0.0.1:9", "https": "http://127.0.0.1:9"}
+    with pytest.raises(Exception, match="Proxy is not working"):
+        transport.get_transport(proxies)
+    assert transport._transports == {}
+
+
+def test_direct_transport_is_not_checked(monkeypatch):
+    monkeypatch.setattr(transport, "_transports", {})
+    monkeypatch.setattr(transport, "PROXY_TEST_URL", "http://127.0.0.1:9/")
+    assert transport.get_transport() is transport.get_transport()
@@ -0,0 +1,78 @@
+import pytest
+
+from meta_ai_api.exceptions import MetaAITokensNotFound
+from meta_ai_api.utils import HOMEPAGE_TOKENS, TokenScanner, extract_value, extract_values
+
+PAGE = (
+    '<html><script>{"_js_datr":{"value":"js-123",'
+    '"abra_csrf":{"value":"csrf-456","x":1},'
+    '"datr":{"value":"real-789",'
+    '["LSD",[],{"token":"lsd-abc"}]'
+    '["DTSGInitData",[],{"token":"dtsg-def"]}</script></html>'
+)
+
+
+def reference(text, markers):
+    """
+    What a whole-text search for the first occurrence of every marker finds.
+    """
+    values = {}
+    for name, (start_str, end_str) in markers.items():
+        start = text.index(start_str) + len(start_str)
+        values[name] = text[start : text.index(end_str, start)]
+    return values
+
+
+def chunked(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_whole_page():
+    values = extract_values([PAGE], HOMEPAGE_TOKENS)
+    assert values == reference(PAGE, HOMEPAGE_TOKENS)
+    # 'datr":{"value":"' first occurs inside the '_js_datr' marker.
+    assert values["datr"] == values["_js_datr"] == "js-123"
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, 64])
+def test_markers_and_values_split_across_chunks(size):
+    assert extract_values(chunked(PAGE, size), HOMEPAGE_TOKENS) == reference(
+        PAGE, HOMEPAGE_TOKENS
+    )
+
+
+def test_every_two_chunk_split():
+    expected = reference(PAGE, HOMEPAGE_TOKENS)
+    for cut in range(1, len(PAGE)):
+        assert extract_values([PAGE[:cut], PAGE[cut:]], HOMEPAGE_TOKENS) == expected
+
+
+def test_stops_reading_once_everything_is_found():
+    consumed = []
+
+    def chunks():
+        for chunk in chunked(PAGE + "x" * 1000, 10):
+            consumed.append(chunk)
+            yield chunk
+
+    extract_values(chunks(), HOMEPAGE_TOKENS)
+    assert len(consumed) * 10 <= len(PAGE) + 10
+
+
+def test_buffer_stays_bounded_between_tokens():
+    scanner = TokenScanner({"lsd": HOMEPAGE_TOKENS["lsd"]})
+    for _ in range(1000):
+        scanner.feed("y" * 100)
+    assert len(scanner._buffer) < len(HOMEPAGE_TOKENS["lsd"][0])
+    scanner.feed('"LSD",[],{"token":"abc"}')
+    assert scanner.finish() == {"lsd": "abc"}
+
+
+def test_missing_token_raises():
+    with pytest.raises(MetaAITokensNotFound, match="fb_dtsg"):
+        extract_values(chunked(PAGE.replace("DTSGInitData", "Other"), 8), HOMEPAGE_TOKENS)
+
+
+def test_missing_end_marker_raises():
+    with pytest.raises(MetaAITokensNotFound):
+        extract_value('"LSD",[],{"token":"never ends', '"LSD",[],{"token":"', '"}')